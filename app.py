@@ -1,117 +1,314 @@
-from flask import Flask, request, render_template_string, jsonify
+from flask import (
+    Flask,
+    Response,
+    g,
+    jsonify,
+    request,
+    stream_with_context,
+)
+from markupsafe import Markup, escape
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
-from dca.data_loader import load_data
-from dca.calculator import DCA_Calculator
+from dca.cache import LRUCache
+from dca import analytics, compression, data_loader, grid as dca_grid
+from dca import portfolio as dca_portfolio
+from dca.data_loader import (
+    TICKERS,
+    cache_stats,
+    load_snapshot,
+    load_snapshots,
+)
+from dca.metrics import SIZE_BUCKETS, registry, span
+from dca.calculator import sweep_start_dates
+from dca.downsample import MIN_POINTS
+from dca.portfolio import Portfolio
+from dca.views import get_view, last_close
+from dca.refresher import Refresher
+from dca.streaming import DCAAccumulator
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
+import cProfile
+import hashlib
+import io
+import json
 import math
+import os
+import pstats
+import threading
+import time
 
 app = Flask(__name__)
 
+_graph_cache = LRUCache(int(os.environ.get("DCA_RESULT_CACHE_SIZE", "512")))
+# シナリオ・データバージョンごとの資産別の計算結果 (CompactResult)
+_result_cache = LRUCache(int(os.environ.get("DCA_SCENARIO_CACHE_SIZE", "1024")))
+# ETag とエンコーディングごとの圧縮済みレスポンス
+_compressed_cache = LRUCache(int(os.environ.get("DCA_COMPRESSED_CACHE_SIZE", "256")))
 
-@app.route("/graph")
-def graph():
-    investment_value = request.args.get("investment", "10")
-    timeframe_value = request.args.get("timeframe", "week")
-    accumulate_years_value = request.args.get("accumulate_period", "4")
-    include_btc = request.args.get("include_btc", "off")
-    start_date_select = request.args.get("start_date_select")
-    custom_date = request.args.get("start_date_custom", "")
-    if start_date_select == "custom":
-        start_date = custom_date or "2020-08-01"
-    elif start_date_select:
-        start_date = start_date_select
-    else:
-        start_date = "2020-08-01"
+REQUEST_SECONDS = registry.histogram(
+    "dca_request_seconds", "Request latency by endpoint.", ("endpoint",)
+)
+RESPONSE_BYTES = registry.histogram(
+    "dca_response_bytes", "Response payload size by endpoint.", ("endpoint",), SIZE_BUCKETS
+)
+
+# ?profile=1 による cProfile は DCA_PROFILE_TOKEN を設定し、
+# 同じ値を X-DCA-Profile ヘッダーで送った場合だけ有効
+PROFILE_TOKEN = os.environ.get("DCA_PROFILE_TOKEN")
+
+# /grid を同時に処理する数。プロセスプールを Web ワーカーが奪い合わないようにする
+GRID_CONCURRENCY = threading.BoundedSemaphore(
+    int(os.environ.get("DCA_GRID_CONCURRENCY", "2"))
+)
+
+# /stream がデータの更新を確認する間隔(秒)
+STREAM_POLL_INTERVAL = float(os.environ.get("DCA_STREAM_POLL_INTERVAL", "15"))
+
+
+def reset_caches():
+    # 読み込み済みのデータと、計算結果・レスポンスのキャッシュをすべて捨てる
+    data_loader.reset_cache()
+    analytics.reset_cache()
+    dca_portfolio.reset_cache()
+    for cache in (_graph_cache, _result_cache, _compressed_cache, _page_cache):
+        cache.clear()
+
+
+@registry.register_collector
+def cache_metrics():
+    caches = {
+        "prices": cache_stats(),
+        "results": _graph_cache.stats(),
+        "scenarios": _result_cache.stats(),
+        "stats": analytics.cache_stats(),
+        "compressed": _compressed_cache.stats(),
+    }
+    metrics = []
+    for stat in ("hits", "misses", "evictions"):
+        metrics.append(
+            (
+                f"dca_cache_{stat}_total",
+                "counter",
+                f"Cache {stat} by cache.",
+                [({"cache": name}, stats[stat]) for name, stats in caches.items()],
+            )
+        )
+    ratios = []
+    for name, stats in caches.items():
+        lookups = stats["hits"] + stats["misses"]
+        ratios.append(({"cache": name}, stats["hits"] / lookups if lookups else 0.0))
+    metrics.append(("dca_cache_hit_ratio", "gauge", "Cache hit ratio by cache.", ratios))
+    return metrics
+
+
+def profiling_requested():
+    return (
+        PROFILE_TOKEN is not None
+        and request.args.get("profile") == "1"
+        and request.headers.get("X-DCA-Profile") == PROFILE_TOKEN
+    )
+
+
+# データの取得はリクエストの外で行う。DCA_BACKGROUND_REFRESH=0 で無効化。
+# import 時には起動しない(プロセスプールのワーカーが app.py を読み込み直すため)。
+# リクエストを受けるプロセスで最初のリクエスト時に起動するので、
+# gunicorn --preload で fork した後の各ワーカーでもそれぞれ動く
+BACKGROUND_REFRESH = os.environ.get("DCA_BACKGROUND_REFRESH", "1") == "1"
+refresher = None
+_refresher_lock = threading.Lock()
+
+
+def start_background_refresh():
+    global refresher
+    if not BACKGROUND_REFRESH:
+        return None
+    with _refresher_lock:
+        if refresher is None:
+            refresher = Refresher(TICKERS, on_refresh=warm_index)
+        # fork 前に起動していてもこのプロセスでは動いていないので起動し直す
+        return refresher.start()
+
+
+@app.before_request
+def start_refresher():
+    if BACKGROUND_REFRESH and not (refresher and refresher.is_running()):
+        start_background_refresh()
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    if profiling_requested():
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.endpoint or "unknown"
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(40)
+        # 差し替える元のレスポンスは閉じて、call_on_close の後片付けを走らせる
+        response.close()
+        response = Response(out.getvalue(), mimetype="text/plain")
+    REQUEST_SECONDS.observe(time.perf_counter() - g.request_started, endpoint=endpoint)
+    if not response.is_streamed:
+        RESPONSE_BYTES.observe(response.calculate_content_length() or 0, endpoint=endpoint)
+    return response
 
-    try:
-        investment = float(investment_value)
-        timeframe = timeframe_value.lower()
-        acc_val = float(accumulate_years_value) if accumulate_years_value else 0
-        if acc_val < 1:
-            accumulate_period = int(acc_val * 12)
-        else:
-            accumulate_period = int(acc_val)
 
-        # MSTR
-        historical_data_mstr = load_data("MSTR")
-        dca_calculator_mstr = DCA_Calculator(
+# after_request は登録と逆順に呼ばれるので、計測より先に圧縮される
+@app.after_request
+def compress_response(response):
+    if (
+        response.status_code != 200
+        or response.is_streamed
+        or response.direct_passthrough
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in compression.COMPRESSIBLE_TYPES
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    encoding = compression.choose_encoding(request.accept_encodings)
+    if encoding is None or len(data) < compression.MIN_SIZE:
+        return response
+
+    etag, _ = response.get_etag()
+    key = (etag, encoding) if etag else None
+    body = _compressed_cache.get(key) if key else None
+    if body is None:
+        with span("compress"):
+            body = compression.compress(data, encoding)
+        if key:
+            _compressed_cache.set(key, body)
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    if etag:
+        # 内容は同じでもバイト列が違うので弱い ETag にする
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def parse_accumulate_period(value):
+    acc_val = float(value) if value else 0
+    if acc_val < 1:
+        return int(acc_val * 12)
+    return int(acc_val)
+
+
+ASSETS = {
+    "MSTR": {
+        "name": "MSTR",
+        "logo": """<img src="https://upload.wikimedia.org/wikipedia/commons/thumb/3/3e/Strategy_logo_%282025%29.svg/2880px-Strategy_logo_%282025%29.svg.png"
+               alt="Strategy"
+               style="max-width:5em; width:5em; height:auto; margin-left:1em; margin-right:0.2em; object-fit:contain; position:absolute; right:1em; top:50%; transform:translateY(-50%); z-index:1; pointer-events:none;">""",
+    },
+    "BTC-USD": {
+        "name": "BTC",
+        "logo": """<img src="https://upload.wikimedia.org/wikipedia/commons/4/46/Bitcoin.svg"
+               alt="BTC"
+               style="height:2.2em;width:auto;margin-left:1em; margin-right:0.2em; position:absolute; right:1em; top:50%; transform:translateY(-50%); z-index:1; pointer-events:none;">""",
+    },
+}
+
+
+def calculate_assets(
+    sources,
+    frames,
+    investment,
+    timeframe,
+    start_date,
+    accumulate_period,
+    anchor=None,
+    versions=None,
+):
+    # 各資産にそれぞれ毎回 investment ずつ積み立てる。
+    # 間引き方や形式が違うだけのリクエストは同じ計算結果を使い回す
+    key = None
+    if versions is not None:
+        key = (
+            tuple(sources),
+            tuple(versions),
             investment,
             timeframe,
-            historical_data_mstr,
             start_date,
             accumulate_period,
+            anchor,
         )
-        returns_mstr = dca_calculator_mstr.calculate_returns()
-        dates_mstr = [data["date"] for data in returns_mstr]
-        values_mstr = [data["value"] for data in returns_mstr]
-        cumulative_investment_mstr = investment * len(returns_mstr)
-        total_invested = cumulative_investment_mstr
-        total_value = values_mstr[-1] if values_mstr else 0
-        percent_change = (
-            (total_value / total_invested - 1) * 100 if total_invested > 0 else 0
-        )
+        assets = _result_cache.get(key)
+        if assets is not None:
+            return assets
+    portfolio = Portfolio({source: 1.0 for source in sources})
+    assets = portfolio.calculate(
+        dict(zip(sources, frames)),
+        investment,
+        timeframe,
+        start_date,
+        accumulate_period,
+        anchor,
+        compact=True,
+    ).assets
+    if key is not None:
+        _result_cache.set(key, assets)
+    return assets
 
-        fig = go.Figure()
-        fig.add_trace(
-            go.Scatter(
-                x=dates_mstr,
-                y=values_mstr,
-                mode="lines+markers",
-                name="MSTR",
-                hovertemplate="Date: %{x}<br>MSTR Value: $%{y:.2f}<extra></extra>",
-            )
-        )
 
-        summary_stats_btc = ""
-        if include_btc == "on":
-            dca_calculator_btc = DCA_Calculator(
-                investment,
-                timeframe,
-                load_data("BTC-USD"),
-                start_date,
-                accumulate_period,
-            )
-            returns_btc = dca_calculator_btc.calculate_returns()
-            dates_btc = [data["date"] for data in returns_btc]
-            values_btc = [data["value"] for data in returns_btc]
-            cumulative_investment_btc = investment * len(returns_btc)
-            fig.add_trace(
-                go.Scatter(
-                    x=dates_btc,
-                    y=values_btc,
-                    mode="lines+markers",
-                    name="BTC",
-                    hovertemplate="Date: %{x}<br>BTC Value: $%{y:.2f}<extra></extra>",
-                )
-            )
-            total_invested_btc = cumulative_investment_btc
-            total_value_btc = values_btc[-1] if values_btc else 0
-            percent_change_btc = (
-                (total_value_btc / total_invested_btc - 1) * 100
-                if total_invested_btc > 0
-                else 0
-            )
+# 比率で返る分析値はパーセントで表示する
+PERCENT_STATS = ("max_drawdown", "cagr", "irr", "volatility", "time_under_water")
+
+
+def summarize(source, returns, historical_data, investment, stats_key=None):
+    total_invested = investment * len(returns)
+    total_value = returns.final_value
+    percent_change = (
+        (total_value / total_invested - 1) * 100 if total_invested > 0 else 0
+    )
+    summary = {
+        "total_invested": total_invested,
+        "total_value": total_value,
+        "percent_change": percent_change,
+    }
+    if source == "BTC-USD":
+        current_btc_usd = last_close(historical_data)
+        summary["sats"] = math.floor((total_value / current_btc_usd) * 10**8)
+    stats = analytics.cached_summary(stats_key, returns)
+    for key, value in stats.items():
+        summary[key] = value * 100 if key in PERCENT_STATS and value is not None else value
+    return summary
 
-            btc_df = load_data("BTC-USD")
-            current_btc_usd = btc_df["Close"].iloc[-1]
-            sat_value_calculated = math.floor(
-                (total_value_btc / current_btc_usd) * 10**8
-            )
 
-            summary_stats_btc = f"""
+def stats_key(source, version, investment, timeframe, start_date, accumulate_period, anchor):
+    # データバージョンが変わらない限り、同じシナリオの分析値は使い回す
+    if version is None:
+        return None
+    return (source, version, investment, timeframe, start_date, accumulate_period, anchor)
+
+
+def format_stat(value, suffix="%"):
+    return "n/a" if value is None else f"{value:.2f}{suffix}"
+
+
+def summary_cards_html(source, summary):
+    logo = ASSETS[source]["logo"]
+    sats_html = ""
+    if "sats" in summary:
+        sats_html = f"""
+            <p class="mb-0" style="white-space:nowrap; position:relative; z-index:2;">{summary["sats"]:,} Satoshis</p>"""
+    return f"""
   <div class="row justify-content-center mt-4">
     <div class="col-12 col-md-4">
       <div class="card shadow-sm">
         <div class="card-body d-flex align-items-center justify-content-between" style="position:relative;">
           <div>
-            <h2 style="margin-bottom:0; white-space:nowrap; position:relative; z-index:2;">${total_invested_btc:.2f}</h2>
+            <h2 style="margin-bottom:0; white-space:nowrap; position:relative; z-index:2;">${summary["total_invested"]:.2f}</h2>
             <p class="mb-0">Total Invested</p>
           </div>
-          <img src="https://upload.wikimedia.org/wikipedia/commons/4/46/Bitcoin.svg"
-               alt="BTC"
-               style="height:2.2em;width:auto;margin-left:1em; margin-right:0.2em; position:absolute; right:1em; top:50%; transform:translateY(-50%); z-index:1; pointer-events:none;">
+          {logo}
         </div>
       </div>
     </div>
@@ -119,13 +316,10 @@ def graph():
       <div class="card shadow-sm">
         <div class="card-body d-flex align-items-center justify-content-between" style="position:relative;">
           <div>
-            <h2 style="margin-bottom:0; white-space:nowrap; position:relative; z-index:2;">${total_value_btc:.2f}</h2>
-            <p class="mb-0" style="white-space:nowrap; position:relative; z-index:2;">{sat_value_calculated:,} Satoshis</p>
+            <h2 style="margin-bottom:0; white-space:nowrap; position:relative; z-index:2;">${summary["total_value"]:.2f}</h2>{sats_html}
             <p class="mb-0">Total Value</p>
           </div>
-          <img src="https://upload.wikimedia.org/wikipedia/commons/4/46/Bitcoin.svg"
-               alt="BTC"
-               style="height:2.2em;width:auto;margin-left:1em; margin-right:0.2em; position:absolute; right:1em; top:50%; transform:translateY(-50%); z-index:1; pointer-events:none;">
+          {logo}
         </div>
       </div>
     </div>
@@ -133,29 +327,24 @@ def graph():
       <div class="card shadow-sm">
         <div class="card-body d-flex align-items-center justify-content-between" style="position:relative;">
           <div>
-            <h2 style="margin-bottom:0; white-space:nowrap; position:relative; z-index:2;">{percent_change_btc:.2f}%</h2>
+            <h2 style="margin-bottom:0; white-space:nowrap; position:relative; z-index:2;">{summary["percent_change"]:.2f}%</h2>
             <p class="mb-0">Percent Change</p>
           </div>
-          <img src="https://upload.wikimedia.org/wikipedia/commons/4/46/Bitcoin.svg"
-               alt="BTC"
-               style="height:2.2em;width:auto;margin-left:1em; margin-right:0.2em; position:absolute; right:1em; top:50%; transform:translateY(-50%); z-index:1; pointer-events:none;">
+          {logo}
         </div>
       </div>
     </div>
   </div>
-"""
-        summary_stats = f"""
-  <div class="row justify-content-center mt-4">
+  <div class="row justify-content-center mt-3">
     <div class="col-12 col-md-4">
       <div class="card shadow-sm">
         <div class="card-body d-flex align-items-center justify-content-between" style="position:relative;">
           <div>
-            <h2 style="margin-bottom:0; white-space:nowrap; position:relative; z-index:2;">${total_invested:.2f}</h2>
-            <p class="mb-0">Total Invested</p>
+            <h2 style="margin-bottom:0; white-space:nowrap; position:relative; z-index:2;">{format_stat(summary["max_drawdown"])}</h2>
+            <p class="mb-0" style="white-space:nowrap; position:relative; z-index:2;">{format_stat(summary["time_under_water"])} of time under water</p>
+            <p class="mb-0">Max Drawdown</p>
           </div>
-          <img src="https://upload.wikimedia.org/wikipedia/commons/thumb/3/3e/Strategy_logo_%282025%29.svg/2880px-Strategy_logo_%282025%29.svg.png"
-               alt="Strategy"
-               style="max-width:5em; width:5em; height:auto; margin-left:1em; margin-right:0.2em; object-fit:contain; position:absolute; right:1em; top:50%; transform:translateY(-50%); z-index:1; pointer-events:none;">
+          {logo}
         </div>
       </div>
     </div>
@@ -163,12 +352,11 @@ def graph():
       <div class="card shadow-sm">
         <div class="card-body d-flex align-items-center justify-content-between" style="position:relative;">
           <div>
-            <h2 style="margin-bottom:0; white-space:nowrap; position:relative; z-index:2;">${total_value:.2f}</h2>
-            <p class="mb-0">Total Value</p>
+            <h2 style="margin-bottom:0; white-space:nowrap; position:relative; z-index:2;">{format_stat(summary["irr"])}</h2>
+            <p class="mb-0" style="white-space:nowrap; position:relative; z-index:2;">CAGR {format_stat(summary["cagr"])}</p>
+            <p class="mb-0">IRR (annual)</p>
           </div>
-          <img src="https://upload.wikimedia.org/wikipedia/commons/thumb/3/3e/Strategy_logo_%282025%29.svg/2880px-Strategy_logo_%282025%29.svg.png"
-               alt="Strategy"
-               style="max-width:5em; width:5em; height:auto; margin-left:1em; margin-right:0.2em; object-fit:contain; position:absolute; right:1em; top:50%; transform:translateY(-50%); z-index:1; pointer-events:none;">
+          {logo}
         </div>
       </div>
     </div>
@@ -176,29 +364,180 @@ def graph():
       <div class="card shadow-sm">
         <div class="card-body d-flex align-items-center justify-content-between" style="position:relative;">
           <div>
-            <h2 style="margin-bottom:0; white-space:nowrap; position:relative; z-index:2;">{percent_change:.2f}%</h2>
-            <p class="mb-0">Percent Change</p>
+            <h2 style="margin-bottom:0; white-space:nowrap; position:relative; z-index:2;">{format_stat(summary["volatility"])}</h2>
+            <p class="mb-0">Volatility (annual)</p>
           </div>
-          <img src="https://upload.wikimedia.org/wikipedia/commons/thumb/3/3e/Strategy_logo_%282025%29.svg/2880px-Strategy_logo_%282025%29.svg.png"
-               alt="Strategy"
-               style="max-width:5em; width:5em; height:auto; margin-left:1em; margin-right:0.2em; object-fit:contain; position:absolute; right:1em; top:50%; transform:translateY(-50%); z-index:1; pointer-events:none;">
+          {logo}
         </div>
       </div>
     </div>
   </div>
 """
-        if include_btc == "on":
-            summary_stats = summary_stats + summary_stats_btc
-
-        fig.update_layout(
-            title="DCA Investment Returns",
-            xaxis_title="Date",
-            yaxis_title="Portfolio Value (USD)",
-            yaxis_type="log",
-        )
 
+
+def build_graph(
+    investment,
+    timeframe,
+    start_date,
+    accumulate_period,
+    sources,
+    frames,
+    max_points=None,
+    errors=None,
+    anchor=None,
+    versions=None,
+):
+    result = calculate_assets(
+        sources,
+        frames,
+        investment,
+        timeframe,
+        start_date,
+        accumulate_period,
+        anchor,
+        versions,
+    )
+    versions = versions or [None] * len(sources)
+
+    fig = go.Figure()
+    summary_stats = ""
+    for source, historical_data, version in zip(sources, frames, versions):
+        returns = result[source]
+        name = ASSETS[source]["name"]
+        # 先頭・末尾・極値は間引いても残るので、集計値は間引く前の結果から計算する
+        plotted = returns.downsample(max_points)
+        with span("figure"):
+            fig.add_trace(
+                go.Scatter(
+                    x=plotted.dates,
+                    y=plotted.value,
+                    mode="lines+markers",
+                    name=name,
+                    hovertemplate=f"Date: %{{x}}<br>{name} Value: $%{{y:.2f}}<extra></extra>",
+                )
+            )
+        with span("summary_html"):
+            key = stats_key(
+                source,
+                version,
+                investment,
+                timeframe,
+                start_date,
+                accumulate_period,
+                anchor,
+            )
+            summary = summarize(source, returns, historical_data, investment, key)
+            summary_stats += summary_cards_html(source, summary)
+    for source, error in (errors or {}).items():
+        summary_stats += f"<p style='color:red;'>Error loading {source}: {escape(str(error))}</p>"
+
+    fig.update_layout(
+        title="DCA Investment Returns",
+        xaxis_title="Date",
+        yaxis_title="Portfolio Value (USD)",
+        yaxis_type="log",
+    )
+
+    with span("to_html"):
         graph_html = fig.to_html(full_html=False, include_plotlyjs=False)
-        return jsonify({"summary_stats": summary_stats, "graph_html": graph_html})
+    return {"summary_stats": summary_stats, "graph_html": graph_html}
+
+
+def load_sources(include_btc):
+    # ソースは並行して読み込む。一部が失敗しても取れた分だけで表示する
+    sources = ["MSTR", "BTC-USD"] if include_btc else ["MSTR"]
+    with span("load"):
+        snapshots, errors = load_snapshots(sources)
+    if not snapshots:
+        raise next(iter(errors.values()))
+    loaded = [source for source in sources if source in snapshots]
+    return loaded, [snapshots[source] for source in loaded], errors
+
+
+def parse_scenario(args):
+    investment_value = args.get("investment", "10")
+    timeframe_value = args.get("timeframe", "week")
+    accumulate_years_value = args.get("accumulate_period", "4")
+    include_btc = args.get("include_btc", "off")
+    start_date_select = args.get("start_date_select")
+    custom_date = args.get("start_date_custom", "")
+    if start_date_select == "custom":
+        start_date = custom_date or "2020-08-01"
+    elif start_date_select:
+        start_date = start_date_select
+    else:
+        start_date = args.get("start_date", "2020-08-01")
+
+    investment = float(investment_value)
+    timeframe = timeframe_value.lower()
+    accumulate_period = parse_accumulate_period(accumulate_years_value)
+    start_date = pd.Timestamp(start_date).strftime("%Y-%m-%d")
+    return investment, timeframe, start_date, accumulate_period, include_btc == "on"
+
+
+def parse_anchor(args):
+    # week は曜日 (0=月曜 ... 6=日曜)、month は日 (1-31)。指定がなければ期間の最初の取引日
+    value = args.get("anchor")
+    if not value:
+        return None
+    return int(value)
+
+
+def parse_max_points(args):
+    # 指定がなければ(または full=1 なら)間引かずに全点を返す
+    value = args.get("max_points")
+    if not value or args.get("full") == "1":
+        return None
+    max_points = int(value)
+    if max_points < MIN_POINTS:
+        raise ValueError(f"max_points must be at least {MIN_POINTS}")
+    return max_points
+
+
+def cached_payload(key, snapshots, build):
+    # 同じ条件・同じデータバージョンなら計算済みの JSON をそのまま返す
+    key = key + (tuple(snapshot.version for snapshot in snapshots),)
+    payload = _graph_cache.get(key)
+    if payload is None:
+        result = build()
+        with span("serialize"):
+            payload = json.dumps(result, separators=(",", ":"))
+        _graph_cache.set(key, payload)
+    return key, payload
+
+
+def cached_json_response(key, snapshots, build):
+    key, payload = cached_payload(key, snapshots, build)
+    response = app.response_class(payload, mimetype="application/json")
+    response.set_etag(hashlib.sha1(repr(key).encode()).hexdigest())
+    response.last_modified = max(snapshot.loaded_at for snapshot in snapshots)
+    return response.make_conditional(request)
+
+
+@app.route("/graph")
+def graph():
+    try:
+        scenario = parse_scenario(request.args)
+        investment, timeframe, start_date, accumulate_period, include_btc = scenario
+        max_points = parse_max_points(request.args)
+        anchor = parse_anchor(request.args)
+        sources, snapshots, errors = load_sources(include_btc)
+        return cached_json_response(
+            ("graph",) + scenario + (anchor, max_points, tuple(sorted(errors))),
+            snapshots,
+            lambda: build_graph(
+                investment,
+                timeframe,
+                start_date,
+                accumulate_period,
+                sources,
+                [snapshot.views for snapshot in snapshots],
+                max_points=max_points,
+                errors=errors,
+                anchor=anchor,
+                versions=[snapshot.version for snapshot in snapshots],
+            ),
+        )
     except Exception as e:
         return jsonify(
             {
@@ -208,94 +547,244 @@ def graph():
         )
 
 
-@app.route("/", methods=["GET"])
-def index():
+def build_series(
+    source,
+    returns,
+    historical_data,
+    investment,
+    delta,
+    max_points=None,
+    stats_key=None,
+):
+    summary = summarize(source, returns, historical_data, investment, stats_key)
+    returns = returns.downsample(max_points)
+    # 日付はエポックからの日数、値は float32 相当(有効数字7桁)に丸める
+    days = returns.days.astype(np.int64)
+    if delta:
+        days = np.diff(days, prepend=0)
+    values = [float(f"{v:.7g}") for v in returns.value.astype(np.float32).tolist()]
+
+    series = {
+        "source": source,
+        "name": ASSETS[source]["name"],
+        "days": days.tolist(),
+        "values": values,
+    }
+    for key, value in summary.items():
+        if value is None or key in ("sats", "longest_under_water_days"):
+            series[key] = value
+        else:
+            series[key] = round(value, 2)
+    return series
+
+
+def build_api_payload(
+    investment,
+    timeframe,
+    start_date,
+    accumulate_period,
+    sources,
+    frames,
+    delta,
+    max_points=None,
+    errors=None,
+    anchor=None,
+    versions=None,
+):
+    result = calculate_assets(
+        sources,
+        frames,
+        investment,
+        timeframe,
+        start_date,
+        accumulate_period,
+        anchor,
+        versions,
+    )
+    versions = versions or [None] * len(sources)
+    return {
+        "start_date": start_date,
+        "days_encoding": "delta" if delta else "absolute",
+        "series": [
+            build_series(
+                source,
+                result[source],
+                historical_data,
+                investment,
+                delta,
+                max_points,
+                stats_key(
+                    source,
+                    version,
+                    investment,
+                    timeframe,
+                    start_date,
+                    accumulate_period,
+                    anchor,
+                ),
+            )
+            for source, historical_data, version in zip(sources, frames, versions)
+        ],
+        "errors": {source: str(error) for source, error in (errors or {}).items()},
+    }
+
+
+def api_request(args):
+    # /api/v1/dca のキャッシュキー・スナップショット・計算関数
+    scenario = parse_scenario(args)
+    investment, timeframe, start_date, accumulate_period, include_btc = scenario
+    delta = args.get("delta") == "1"
+    max_points = parse_max_points(args)
+    anchor = parse_anchor(args)
+    sources, snapshots, errors = load_sources(include_btc)
+    return (
+        ("api",) + scenario + (anchor, delta, max_points, tuple(sorted(errors))),
+        snapshots,
+        lambda: build_api_payload(
+            investment,
+            timeframe,
+            start_date,
+            accumulate_period,
+            sources,
+            [snapshot.views for snapshot in snapshots],
+            delta,
+            max_points,
+            errors,
+            anchor,
+            [snapshot.version for snapshot in snapshots],
+        ),
+    )
+
+
+@app.route("/api/v1/dca")
+def api_dca():
+    try:
+        return cached_json_response(*api_request(request.args))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+def sse_event(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+@app.route("/stream")
+def stream():
+    # Server-Sent Events で DCA の最新値を配信する。新しいバーが入ったときは
+    # アキュムレーターに差分だけを渡すので、全期間を計算し直すことはない
+    source = request.args.get("source", "MSTR")
+    if source not in TICKERS:
+        return jsonify({"error": f"Unknown source: {source}"}), 400
+    try:
+        investment, timeframe, start_date, accumulate_period, _ = parse_scenario(
+            request.args
+        )
+        snapshot = load_snapshot(source)
+        accumulator = DCAAccumulator.from_history(
+            snapshot.views, investment, timeframe, start_date, accumulate_period
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+    def events(snapshot, accumulator):
+        yield sse_event({"source": source, **accumulator.state()}, "snapshot")
+        while True:
+            time.sleep(STREAM_POLL_INTERVAL)
+            latest = load_snapshot(source)
+            if latest.version == snapshot.version:
+                yield ": keepalive\n\n"
+                continue
+            snapshot = latest
+            if accumulator.history_changed(snapshot.views):
+                # 分割などで履歴全体が書き直された場合は最初から計算し直す
+                accumulator = DCAAccumulator.from_history(
+                    snapshot.views, investment, timeframe, start_date, accumulate_period
+                )
+                yield sse_event({"source": source, **accumulator.state()}, "snapshot")
+                continue
+            # 最後に取り込んだ日以降のバーだけを取り込む(当日分の更新を含む)
+            last = accumulator.last_day
+            start = None if last is None else np.datetime64(last, "D")
+            dates, closes = get_view(snapshot.views, "day").slice(start)
+            for date, close in zip(dates, closes):
+                accumulator.update(date, close)
+            yield sse_event({"source": source, **accumulator.state()}, "update")
+
+    response = Response(
+        stream_with_context(events(snapshot, accumulator)), mimetype="text/event-stream"
+    )
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+@app.route("/grid", methods=["POST"])
+def grid():
+    # {"grid": {"source": [...], "timeframe": [...], "investment": [...],
+    #           "start_date": [...] または {"start", "end", "freq"},
+    #           "accumulate_years": [...]}}
+    # 結果は終わった順に NDJSON で返す
+    try:
+        body = request.get_json(force=True) or {}
+        scenarios = dca_grid.expand_grid(body.get("grid", {}))
+        chunk_size = dca_grid.check_chunk_size(body.get("chunk_size", 256))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    if not GRID_CONCURRENCY.acquire(blocking=False):
+        return jsonify({"error": "Too many grid requests in progress"}), 429
+
+    def lines():
+        sources = sorted({scenario["source"] for scenario in scenarios})
+        directory = dca_grid.prepare_columns(sources)
+        for row in dca_grid.run_grid(scenarios, directory, chunk_size=chunk_size):
+            yield json.dumps(row) + "\n"
+
+    response = Response(stream_with_context(lines()), mimetype="application/x-ndjson")
+    # ジェネレーターが始まらずに捨てられた場合も、レスポンスを閉じたときに枠を返す
+    response.call_on_close(GRID_CONCURRENCY.release)
+    return response
+
+
+@app.route("/metrics")
+def metrics():
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/sweep")
+def sweep():
+    source = request.args.get("source", "MSTR")
     investment_value = request.args.get("investment", "10")
     timeframe_value = request.args.get("timeframe", "week")
     accumulate_years_value = request.args.get("accumulate_period", "4")
-    include_btc = request.args.get("include_btc", "off")
-    start_date_select = request.args.get("start_date_select")
-    custom_date = request.args.get("start_date_custom", "")
-    if start_date_select == "custom":
-        custom_date_div_style = "display: block;"
-    else:
-        custom_date_div_style = "display: none;"
-
-    today = datetime.today()
-    options = []
-    half_year = today - relativedelta(months=6)
-    options.append(("6months", half_year.strftime("%Y-%m-%d"), "6 months ago"))
-    for i in range(1, 11):
-        option_date = today - relativedelta(years=i)
-        options.append((f"{i}year", option_date.strftime("%Y-%m-%d"), f"{i} year ago"))
-
-    options_html = ""
-    for value, date_str, label in options:
-        selected = " selected" if start_date_select == date_str else ""
-        options_html += f'<option value="{date_str}"{selected}>{label}</option>'
-    custom_selected = " selected" if start_date_select == "custom" else ""
-    options_html += f'<option value="custom"{custom_selected}>Custom Date</option>'
-
-    form_html = f"""
-    <form id="dca-form" autocomplete="off">
-      <div class="mb-3">
-        <label class="form-label">Purchase Amount</label>
-        <div class="input-group">
-          <span class="input-group-text">$</span>
-          <input type="number" name="investment" value="{investment_value}" class="form-control" step="1" min="1">
-        </div>
-      </div>
-      <div class="mb-3">
-        <label class="form-label">Repeat Purchase</label>
-        <select name="timeframe" class="form-select">
-          <option value="day" {"selected" if timeframe_value=="day" else ""}>Dayly</option>
-          <option value="week" {"selected" if timeframe_value=="week" else ""}>Weekly</option>
-          <option value="month" {"selected" if timeframe_value=="month" else ""}>Monthly</option>
-          <option value="year" {"selected" if timeframe_value=="year" else ""}>Yearly</option>
-        </select>
-      </div>
-      <div class="mb-3">
-        <label class="form-label">Start Date</label>
-        <select name="start_date_select" id="start_date_select" class="form-select">
-          {options_html}
-        </select>
-      </div>
-      <div id="custom_date_div" class="mb-3" style="{custom_date_div_style}">
-        <label class="form-label">Custom Date (YYYY-MM-DD)</label>
-        <input type="text" name="start_date_custom" placeholder="YYYY-MM-DD" class="form-control"
-    value="{custom_date if '-' in custom_date else (custom_date[:4] + '-' + custom_date[4:6] + '-' + custom_date[6:8]) if len(custom_date)==8 else ''}"
-    maxlength="10"
-    oninput="
-      this.value = this.value.replace(/[^0-9]/g,'');
-      if(this.value.length > 4) this.value = this.value.slice(0,4) + '-' + this.value.slice(4);
-      if(this.value.length > 7) this.value = this.value.slice(0,7) + '-' + this.value.slice(7,10);
-    "
-  >
-      </div>
-      <div class="mb-3">
-        <label class="form-label">Accumulate For</label>
-        <select name="accumulate_period" class="form-select">
-          <option value="0.5" {"selected" if accumulate_years_value=="0.5" else ""}>6 months</option>
-          <option value="1" {"selected" if accumulate_years_value=="1" else ""}>1 year</option>
-          <option value="2" {"selected" if accumulate_years_value=="2" else ""}>2 years</option>
-          <option value="3" {"selected" if accumulate_years_value=="3" else ""}>3 years</option>
-          <option value="4" {"selected" if accumulate_years_value=="4" else ""}>4 years</option>
-          <option value="5" {"selected" if accumulate_years_value=="5" else ""}>5 years</option>
-          <option value="6" {"selected" if accumulate_years_value=="6" else ""}>6 years</option>
-          <option value="7" {"selected" if accumulate_years_value=="7" else ""}>7 years</option>
-          <option value="8" {"selected" if accumulate_years_value=="8" else ""}>8 years</option>
-          <option value="9" {"selected" if accumulate_years_value=="9" else ""}>9 years</option>
-          <option value="10" {"selected" if accumulate_years_value=="10" else ""}>10 years</option>
-        </select>
-      </div>
-      <div class="mb-3 form-check">
-        <input type="checkbox" name="include_btc" class="form-check-input" {"checked" if include_btc=="on" else ""}>
-        <label class="form-check-label">Include Bitcoin</label>
-      </div>
-    </form>
-    """
 
-    html = f"""
+    if source not in TICKERS:
+        return jsonify({"error": f"Unknown source: {source}"}), 400
+
+    try:
+        investment = float(investment_value)
+        result = sweep_start_dates(
+            load_snapshot(source).views,
+            investment,
+            timeframe_value.lower(),
+            parse_accumulate_period(accumulate_years_value),
+        )
+        return jsonify(
+            {
+                "source": source,
+                "start_dates": pd.DatetimeIndex(result.start_dates)
+                .strftime("%Y-%m-%d")
+                .tolist(),
+                "final_value": result.final_value.round(2).tolist(),
+                "invested": result.invested.round(2).tolist(),
+                "roi": result.roi.round(6).tolist(),
+            }
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+INDEX_TEMPLATE = """
 <!DOCTYPE html>
 <html lang="ja">
   <head>
@@ -305,28 +794,28 @@ def index():
     <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
     <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
         <style>
-      body {{
+      body {
         background-color: #f8f9fa;
         padding-bottom: 20px;
-      }}
-      .navbar-brand {{
+      }
+      .navbar-brand {
         font-weight: bold;
-      }}
-      .card {{
+      }
+      .card {
         margin-top: 20px;
-      }}
-      .form-control {{
+      }
+      .form-control {
         height: 40px;
-      }}
-      .form-label {{
+      }
+      .form-label {
         font-size: 0.9rem;
-      }}
-      .summary-container {{
+      }
+      .summary-container {
         width: 100%;
         margin-bottom: 20px;
-      }}
+      }
       /* サマリーboxの高さを統一 */
-      .summary-container .card {{
+      .summary-container .card {
         height: 100%;
         min-height: 100px; /* 140px→100pxに調整 */
         margin-top: 10px;  /* 余白を減らす */
@@ -334,46 +823,46 @@ def index():
         display: flex;
         flex-direction: column;
         justify-content: center;
-      }}
-      .summary-container .card-body {{
+      }
+      .summary-container .card-body {
         height: 100%;
         padding-top: 10px;    /* 余白を減らす */
         padding-bottom: 10px; /* 余白を減らす */
         display: flex;
         align-items: center;
         justify-content: space-between;
-      }}
-      .summary-container .card-body h2 {{
+      }
+      .summary-container .card-body h2 {
         font-size: 1.5rem;
         margin-bottom: 0;
-      }}
-      .summary-container .card-body p {{
+      }
+      .summary-container .card-body p {
         font-size: 0.85rem;
         margin-bottom: 0;
         color: #444; /* 文字色を薄く */
         font-weight: 400;
-      }}
-      .form-graph-row {{
+      }
+      .form-graph-row {
         display: flex;
         flex-direction: column;
         gap: 20px;
-      }}
-      .input-container, .graph-container {{
+      }
+      .input-container, .graph-container {
         width: 100%;
-      }}
-      @media (min-width: 1024px) {{
-        .form-graph-row {{
+      }
+      @media (min-width: 1024px) {
+        .form-graph-row {
           flex-direction: row;
-        }}
-        .input-container {{
+        }
+        .input-container {
           width: 25%;
           flex: 1 1 0;
-        }}
-        .graph-container {{
+        }
+        .graph-container {
           width: 75%;
           flex: 3 1 0;
-        }}
-      }}
+        }
+      }
     </style>
   </head>
   <body>
@@ -398,7 +887,57 @@ def index():
               <div class="input-container">
                 <div class="card shadow-sm">
                   <div class="card-body">
-                    {form_html}
+                    <form id="dca-form" autocomplete="off">
+      <div class="mb-3">
+        <label class="form-label">Purchase Amount</label>
+        <div class="input-group">
+          <span class="input-group-text">$</span>
+          <input type="number" name="investment" value="{{ investment_value }}" class="form-control" step="1" min="1">
+        </div>
+      </div>
+      <div class="mb-3">
+        <label class="form-label">Repeat Purchase</label>
+        <select name="timeframe" class="form-select">
+          <option value="day" {{ "selected" if timeframe_value == "day" }}>Dayly</option>
+          <option value="week" {{ "selected" if timeframe_value == "week" }}>Weekly</option>
+          <option value="month" {{ "selected" if timeframe_value == "month" }}>Monthly</option>
+          <option value="year" {{ "selected" if timeframe_value == "year" }}>Yearly</option>
+        </select>
+      </div>
+      <div class="mb-3">
+        <label class="form-label">Start Date</label>
+        <select name="start_date_select" id="start_date_select" class="form-select">
+          {% for date_str, label in date_options %}
+          <option value="{{ date_str }}"{{ " selected" if start_date_select == date_str }}>{{ label }}</option>
+          {% endfor %}
+          <option value="custom"{{ " selected" if start_date_select == "custom" }}>Custom Date</option>
+        </select>
+      </div>
+      <div id="custom_date_div" class="mb-3" style="display: {{ "block" if start_date_select == "custom" else "none" }};">
+        <label class="form-label">Custom Date (YYYY-MM-DD)</label>
+        <input type="text" name="start_date_custom" placeholder="YYYY-MM-DD" class="form-control"
+    value="{{ custom_date }}"
+    maxlength="10"
+    oninput="
+      this.value = this.value.replace(/[^0-9]/g,'');
+      if(this.value.length > 4) this.value = this.value.slice(0,4) + '-' + this.value.slice(4);
+      if(this.value.length > 7) this.value = this.value.slice(0,7) + '-' + this.value.slice(7,10);
+    "
+  >
+      </div>
+      <div class="mb-3">
+        <label class="form-label">Accumulate For</label>
+        <select name="accumulate_period" class="form-select">
+          {% for value, label in accumulate_options %}
+          <option value="{{ value }}"{{ " selected" if accumulate_years_value == value }}>{{ label }}</option>
+          {% endfor %}
+        </select>
+      </div>
+      <div class="mb-3 form-check">
+        <input type="checkbox" name="include_btc" class="form-check-input" {{ "checked" if include_btc == "on" }}>
+        <label class="form-check-label">Include Bitcoin</label>
+      </div>
+    </form>
                   </div>
                 </div>
               </div>
@@ -409,51 +948,227 @@ def index():
       </div>
     </div>
     <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
+    {% if initial_payload %}
+    <script id="initial-data" type="application/json">{{ initial_payload }}</script>
+    {% endif %}
     <script>
-    function updateGraph() {{
+    const LOGOS = {
+      MSTR: '<img src="https://upload.wikimedia.org/wikipedia/commons/thumb/3/3e/Strategy_logo_%282025%29.svg/2880px-Strategy_logo_%282025%29.svg.png" alt="Strategy" style="max-width:5em; width:5em; height:auto; margin-left:1em; margin-right:0.2em; object-fit:contain; position:absolute; right:1em; top:50%; transform:translateY(-50%); z-index:1; pointer-events:none;">',
+      BTC: '<img src="https://upload.wikimedia.org/wikipedia/commons/4/46/Bitcoin.svg" alt="BTC" style="height:2.2em;width:auto;margin-left:1em; margin-right:0.2em; position:absolute; right:1em; top:50%; transform:translateY(-50%); z-index:1; pointer-events:none;">'
+    };
+    function summaryCard(value, label, logo, extra, first) {
+      return `
+    <div class="col-12 col-md-4${first ? '' : ' mt-3 mt-md-0'}">
+      <div class="card shadow-sm">
+        <div class="card-body d-flex align-items-center justify-content-between" style="position:relative;">
+          <div>
+            <h2 style="margin-bottom:0; white-space:nowrap; position:relative; z-index:2;">${value}</h2>
+            ${extra || ''}
+            <p class="mb-0">${label}</p>
+          </div>
+          ${logo}
+        </div>
+      </div>
+    </div>`;
+    }
+    function formatStat(value) {
+      return value === null || value === undefined ? 'n/a' : value.toFixed(2) + '%';
+    }
+    function note(text) {
+      return `<p class="mb-0" style="white-space:nowrap; position:relative; z-index:2;">${text}</p>`;
+    }
+    function renderSummary(series) {
+      return series.map(s => {
+        const logo = LOGOS[s.name];
+        const sats = s.sats === undefined ? '' :
+          `<p class="mb-0" style="white-space:nowrap; position:relative; z-index:2;">${s.sats.toLocaleString('en-US')} Satoshis</p>`;
+        return '<div class="row justify-content-center mt-4">' +
+          summaryCard('$' + s.total_invested.toFixed(2), 'Total Invested', logo, '', true) +
+          summaryCard('$' + s.total_value.toFixed(2), 'Total Value', logo, sats, false) +
+          summaryCard(s.percent_change.toFixed(2) + '%', 'Percent Change', logo, '', false) +
+          '</div><div class="row justify-content-center mt-3">' +
+          summaryCard(formatStat(s.max_drawdown), 'Max Drawdown', logo,
+            note(formatStat(s.time_under_water) + ' of time under water'), true) +
+          summaryCard(formatStat(s.irr), 'IRR (annual)', logo, note('CAGR ' + formatStat(s.cagr)), false) +
+          summaryCard(formatStat(s.volatility), 'Volatility (annual)', logo, '', false) +
+          '</div>';
+      }).join('');
+    }
+    // エポックからの日数(差分エンコード)を日付文字列に戻す
+    function decodeDays(days, encoding) {
+      let day = 0;
+      return days.map(v => {
+        day = encoding === 'delta' ? day + v : v;
+        return new Date(day * 86400000).toISOString().slice(0, 10);
+      });
+    }
+    function renderGraph(data) {
+      if (data.error) {
+        const message = document.createElement('p');
+        message.style.color = 'red';
+        message.textContent = 'Error: ' + data.error;
+        document.getElementById('summary-area').replaceChildren(message);
+        return;
+      }
+      const summaryArea = document.getElementById('summary-area');
+      summaryArea.innerHTML = renderSummary(data.series);
+      Object.entries(data.errors || {}).forEach(([source, error]) => {
+        const message = document.createElement('p');
+        message.style.color = 'red';
+        message.textContent = 'Error loading ' + source + ': ' + error;
+        summaryArea.appendChild(message);
+      });
+      const traces = data.series.map(s => ({
+        x: decodeDays(s.days, data.days_encoding),
+        y: s.values,
+        mode: 'lines+markers',
+        name: s.name,
+        hovertemplate: 'Date: %{x}<br>' + s.name + ' Value: $%{y:.2f}<extra></extra>'
+      }));
+      Plotly.react('graph-area', traces, {
+        title: 'DCA Investment Returns',
+        xaxis: {title: 'Date'},
+        yaxis: {title: 'Portfolio Value (USD)', type: 'log'}
+      });
+    }
+    function updateGraph() {
       const form = document.getElementById('dca-form');
       const params = new URLSearchParams(new FormData(form));
-      fetch('/graph?' + params.toString())
+      params.set('delta', '1');
+      params.set('max_points', '1000');
+      fetch('/api/v1/dca?' + params.toString())
         .then(res => res.json())
-        .then(data => {{
-          document.getElementById('summary-area').innerHTML = data.summary_stats;
-          document.getElementById('graph-area').innerHTML = data.graph_html;
-          // Plotlyのscriptタグを実行
-          document.getElementById('graph-area').querySelectorAll("script").forEach(oldScript => {{
-            const newScript = document.createElement("script");
-            if (oldScript.src) {{
-              newScript.src = oldScript.src;
-            }} else {{
-              newScript.textContent = oldScript.textContent;
-            }}
-            document.body.appendChild(newScript);
-            document.body.removeChild(newScript);
-          }});
-        }});
-    }}
+        .then(renderGraph);
+    }
     // すべての入力欄にイベントを付与
-    document.querySelectorAll('#dca-form input, #dca-form select').forEach(el => {{
+    document.querySelectorAll('#dca-form input, #dca-form select').forEach(el => {
       el.addEventListener('input', updateGraph);
       el.addEventListener('change', updateGraph);
-    }});
+    });
     // カスタム日付欄の表示制御
-    document.getElementById('start_date_select').addEventListener('change', function() {{
+    document.getElementById('start_date_select').addEventListener('change', function() {
       var customDiv = document.getElementById('custom_date_div');
-      if (this.value === 'custom') {{
+      if (this.value === 'custom') {
           customDiv.style.display = 'block';
-      }} else {{
+      } else {
           customDiv.style.display = 'none';
-      }}
-    }});
-    // ページロード時に一度グラフを表示
-    window.addEventListener('DOMContentLoaded', updateGraph);
+      }
+    });
+    // ページに埋め込まれた初期データがあれば、取得を待たずに表示する
+    window.addEventListener('DOMContentLoaded', () => {
+      const initial = document.getElementById('initial-data');
+      if (initial) {
+        renderGraph(JSON.parse(initial.textContent));
+      } else {
+        updateGraph();
+      }
+    });
     </script>
   </body>
 </html>
-
 """
-    return render_template_string(html)
+
+ACCUMULATE_OPTIONS = [("0.5", "6 months"), ("1", "1 year")] + [
+    (str(years), f"{years} years") for years in range(2, 11)
+]
+
+_index_template = None
+_page_cache = LRUCache(int(os.environ.get("DCA_PAGE_CACHE_SIZE", "64")))
+_date_options = {}
+
+
+def index_template():
+    # テンプレートは最初の一度だけコンパイルする
+    global _index_template
+    if _index_template is None:
+        _index_template = app.jinja_env.from_string(INDEX_TEMPLATE)
+    return _index_template
+
+
+def date_options(today):
+    # 開始日の選択肢は日付が変わったときだけ作り直す
+    options = _date_options.get(today)
+    if options is None:
+        options = [((today - relativedelta(months=6)).strftime("%Y-%m-%d"), "6 months ago")]
+        for i in range(1, 11):
+            option_date = today - relativedelta(years=i)
+            options.append((option_date.strftime("%Y-%m-%d"), f"{i} year ago"))
+        _date_options.clear()
+        _date_options[today] = options
+    return options
+
+
+def format_custom_date(value):
+    if "-" in value:
+        return value
+    if len(value) == 8:
+        return f"{value[:4]}-{value[4:6]}-{value[6:8]}"
+    return ""
+
+
+def form_state(args, options):
+    # フォームの初期状態。開始日の指定がなければ先頭の選択肢が選ばれる
+    return {
+        "investment": args.get("investment", "10"),
+        "timeframe": args.get("timeframe", "week"),
+        "start_date_select": args.get("start_date_select") or options[0][0],
+        "start_date_custom": args.get("start_date_custom", ""),
+        "accumulate_period": args.get("accumulate_period", "4"),
+        "include_btc": args.get("include_btc", "off"),
+    }
+
+
+def embedded_payload(state):
+    # ページを開いたときにブラウザが取りに来るのと同じ /api/v1/dca の結果を
+    # 埋め込む。キャッシュも API と共有する
+    args = {**state, "delta": "1", "max_points": "1000"}
+    try:
+        key, payload = cached_payload(*api_request(args))
+    except Exception:
+        return None, None
+    return key, payload
+
+
+def render_index(args):
+    today = datetime.today().date()
+    options = date_options(today)
+    state = form_state(args, options)
+    payload_key, payload = embedded_payload(state)
+    # 同じ入力・同じデータバージョンなら描画済みのページを返す
+    key = ("index", today, tuple(sorted(state.items())), payload_key)
+    page = _page_cache.get(key)
+    if page is None:
+        with span("render_index"):
+            page = index_template().render(
+                investment_value=state["investment"],
+                timeframe_value=state["timeframe"],
+                start_date_select=state["start_date_select"],
+                custom_date=format_custom_date(state["start_date_custom"]),
+                accumulate_years_value=state["accumulate_period"],
+                include_btc=state["include_btc"],
+                date_options=options,
+                accumulate_options=ACCUMULATE_OPTIONS,
+                # </script> で閉じられないように < をエスケープして埋め込む
+                initial_payload=payload and Markup(payload.replace("<", "\\u003c")),
+            )
+        _page_cache.set(key, page)
+    return key, page
+
+
+def warm_index(source=None, snapshot=None):
+    # データ更新のたびに既定のランディングページを描画しておく
+    with app.app_context():
+        render_index({})
+
+
+@app.route("/", methods=["GET"])
+def index():
+    key, page = render_index(request.args)
+    response = app.response_class(page, mimetype="text/html")
+    response.set_etag(hashlib.sha1(repr(key).encode()).hexdigest())
+    return response.make_conditional(request)
 
 
 if __name__ == "__main__":
+    start_background_refresh()
     app.run(debug=True)
@@ -0,0 +1,199 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from benchmarks.fixtures import synthetic_ohlc, write_fixture_dir  # noqa: E402
+
+TIMEFRAMES = ("day", "week", "month", "year")
+WINDOWS = (None, 1, 4)
+
+
+def measure(func, repeat):
+    # 実行時間は repeat 回の min / median、メモリは1回分のピーク
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"min": min(times), "median": statistics.median(times), "peak_bytes": peak}
+
+
+def bench_calculator(sizes, repeat):
+    from dca.calculator import DCA_Calculator
+    from dca.views import PriceViews, build_view
+
+    results = []
+    for size in sizes:
+        frame = synthetic_ohlc(size)
+        start_date = frame.index[0]
+        results.append(
+            {
+                "name": "views.build",
+                "params": {"bars": size},
+                **measure(lambda: [build_view(frame, tf) for tf in TIMEFRAMES], repeat),
+            }
+        )
+        # アプリと同じく、スナップショットのビューを使い回した計算を測る
+        views = PriceViews(frame)
+        for timeframe in TIMEFRAMES:
+            for window in WINDOWS:
+                calculator = DCA_Calculator(10, timeframe, views, start_date, window)
+                results.append(
+                    {
+                        "name": "calculator.calculate",
+                        "params": {"bars": size, "timeframe": timeframe, "window": window},
+                        **measure(calculator.calculate, repeat),
+                    }
+                )
+    return results
+
+
+def bench_loader(sizes, repeat, workdir):
+    from dca.data_loader import _load_uncached
+
+    results = []
+    for size in sizes:
+        path = os.path.join(workdir, f"prices_{size}.csv")
+        synthetic_ohlc(size).to_csv(path)
+        results.append(
+            {
+                "name": "loader.csv",
+                "params": {"bars": size},
+                **measure(lambda: _load_uncached(path), repeat),
+            }
+        )
+    return results
+
+
+def bench_graph(size, repeat, workdir):
+    # app の import 前に環境変数を設定して、フィクスチャだけを読むようにする
+    fixture_dir = write_fixture_dir(os.path.join(workdir, "fixtures"), size)
+    os.environ["DCA_FIXTURE_DIR"] = fixture_dir
+    os.environ["DCA_STORE_DIR"] = os.path.join(workdir, "store")
+    os.environ["DCA_BACKGROUND_REFRESH"] = "0"
+
+    import app as app_module
+    from dca import data_loader
+    from dca.price_store import CSVFetcher
+
+    data_loader.configure_store(os.environ["DCA_STORE_DIR"], CSVFetcher(fixture_dir))
+    client = app_module.app.test_client()
+    start = pd.Timestamp("2010-01-01")
+
+    def cold(path):
+        # データの読み込みと、計算結果・分析値を含むすべてのキャッシュを毎回捨てる
+        def run():
+            app_module.reset_caches()
+            assert client.get(path).status_code == 200
+        return run
+
+    def warm(path):
+        client.get(path)
+        return lambda: client.get(path)
+
+    results = []
+    for endpoint in ("/graph", "/api/v1/dca"):
+        for timeframe in TIMEFRAMES:
+            path = (
+                f"{endpoint}?timeframe={timeframe}&include_btc=on"
+                f"&start_date_select={start:%Y-%m-%d}&accumulate_period=4"
+            )
+            for mode, factory in (("cold", cold), ("warm", warm)):
+                results.append(
+                    {
+                        "name": f"endpoint{endpoint.replace('/', '.')}",
+                        "params": {"bars": size, "timeframe": timeframe, "cache": mode},
+                        **measure(factory(path), repeat),
+                    }
+                )
+    return results
+
+
+def result_key(result):
+    return result["name"] + json.dumps(result["params"], sort_keys=True)
+
+
+def compare(results, baseline, tolerance):
+    # median がベースラインより tolerance 以上遅くなったものを返す
+    previous = {result_key(r): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        base = previous.get(result_key(result))
+        if base and result["median"] > base["median"] * (1 + tolerance):
+            regressions.append((result, base))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the DCA calculator, loader and endpoints")
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000")
+    parser.add_argument("--graph-size", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", choices=("calculator", "loader", "graph"), action="append")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    suites = args.only or ["calculator", "loader", "graph"]
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        if "calculator" in suites:
+            results += bench_calculator(sizes, args.repeat)
+        if "loader" in suites:
+            results += bench_loader(sizes, args.repeat, workdir)
+        if "graph" in suites:
+            results += bench_graph(args.graph_size, args.repeat, workdir)
+
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for result in results:
+        print(
+            f"{result['name']:<24} {json.dumps(result['params']):<60} "
+            f"median={result['median'] * 1000:9.3f}ms peak={result['peak_bytes'] / 2**20:8.2f}MiB"
+        )
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for result, base in regressions:
+            print(
+                f"REGRESSION {result['name']} {json.dumps(result['params'])}: "
+                f"{base['median'] * 1000:.3f}ms -> {result['median'] * 1000:.3f}ms"
+            )
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
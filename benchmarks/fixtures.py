@@ -0,0 +1,35 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def synthetic_ohlc(n_bars, seed=0, start="1970-01-01", freq=None):
+    # 幾何ブラウン運動の終値から OHLC を作る。ネットワークは使わない
+    if freq is None:
+        # 日足で 8 万本を超えると Timestamp の範囲(2262年)を超えうるので時間足にする
+        freq = "D" if n_bars <= 80_000 else "h"
+    rng = np.random.default_rng(seed)
+    # ドリフトなし。1M 本でも float32 の範囲に収まる
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0, 0.03, n_bars)))
+    spread = np.abs(rng.normal(0, 0.01, n_bars)) * close
+    index = pd.date_range(start, periods=n_bars, freq=freq, name="Date")
+    return pd.DataFrame(
+        {
+            "Open": close + rng.normal(0, 0.005, n_bars) * close,
+            "High": close + spread,
+            "Low": close - spread,
+            "Close": close,
+            "Volume": rng.integers(1_000, 1_000_000, n_bars),
+        },
+        index=index,
+    )
+
+
+def write_fixture_dir(directory, n_bars, tickers=("MSTR", "BTC-USD"), start="2010-01-01"):
+    # CSVFetcher (DCA_FIXTURE_DIR) がそのまま読める形で書き出す
+    os.makedirs(directory, exist_ok=True)
+    for seed, ticker in enumerate(tickers):
+        frame = synthetic_ohlc(n_bars, seed=seed, start=start)
+        frame.to_csv(os.path.join(directory, f"{ticker}.csv"))
+    return directory
@@ -0,0 +1,126 @@
+import argparse
+import json
+import sys
+
+from dca import grid, report
+from dca.downsample import MIN_POINTS
+
+
+def max_points(value):
+    value = int(value)
+    if value < MIN_POINTS:
+        raise argparse.ArgumentTypeError(f"must be at least {MIN_POINTS}")
+    return value
+
+
+def chunk_size(value):
+    try:
+        return grid.check_chunk_size(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def add_scenario_arguments(parser):
+    parser.add_argument("--source", nargs="+", default=["MSTR"])
+    parser.add_argument("--timeframe", nargs="+", default=["week"])
+    parser.add_argument("--investment", nargs="+", type=float, default=[10.0])
+    parser.add_argument("--start-date", nargs="+", default=None)
+    parser.add_argument(
+        "--start-range",
+        nargs=3,
+        metavar=("START", "END", "FREQ"),
+        help="Every start date in a range, e.g. 2015-01-01 2020-12-31 MS",
+    )
+    parser.add_argument(
+        "--accumulate-years",
+        nargs="+",
+        type=int,
+        default=[0],
+        help="0 means accumulate until the end of the data",
+    )
+
+
+def scenarios_from_args(args):
+    start_date = args.start_date or grid.GRID_DEFAULTS["start_date"]
+    if args.start_range:
+        start, end, freq = args.start_range
+        start_date = {"start": start, "end": end, "freq": freq}
+    return grid.expand_grid(
+        {
+            "source": args.source,
+            "timeframe": args.timeframe,
+            "investment": args.investment,
+            "start_date": start_date,
+            "accumulate_years": [years or None for years in args.accumulate_years],
+        }
+    )
+
+
+def add_grid_parser(subparsers):
+    parser = subparsers.add_parser(
+        "grid", help="Run a what-if grid over a process pool and print NDJSON"
+    )
+    add_scenario_arguments(parser)
+    parser.add_argument("--chunk-size", type=chunk_size, default=256)
+    parser.add_argument("--output", "-o", help="Write NDJSON here instead of stdout")
+    parser.set_defaults(func=run_grid_command)
+
+
+def run_grid_command(args):
+    scenarios = scenarios_from_args(args)
+    directory = grid.prepare_columns(sorted(set(args.source)))
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for row in grid.run_grid(scenarios, directory, chunk_size=args.chunk_size):
+            out.write(json.dumps(row) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+def add_run_parser(subparsers):
+    parser = subparsers.add_parser(
+        "run", help="Render a chart per scenario and a summary CSV, headlessly"
+    )
+    add_scenario_arguments(parser)
+    parser.add_argument("--out-dir", "-o", default="reports")
+    parser.add_argument(
+        "--format", nargs="+", choices=report.FORMATS, default=["png"], dest="formats"
+    )
+    parser.add_argument(
+        "--max-points",
+        type=max_points,
+        default=2000,
+        help="Downsample each chart to at most this many points",
+    )
+    parser.add_argument("--chunk-size", type=chunk_size, default=16)
+    parser.set_defaults(func=run_report_command)
+
+
+def run_report_command(args):
+    summary_path, failed = report.run_report(
+        scenarios_from_args(args),
+        args.out_dir,
+        formats=args.formats,
+        max_points=args.max_points,
+        chunk_size=args.chunk_size,
+    )
+    print(summary_path)
+    if failed:
+        print(f"{failed} scenarios failed, see {summary_path}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m dca")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    add_grid_parser(subparsers)
+    add_run_parser(subparsers)
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
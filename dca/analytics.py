@@ -0,0 +1,131 @@
+import os
+
+import numpy as np
+
+from dca.cache import LRUCache
+
+DAYS_PER_YEAR = 365.25
+IRR_MAX_ITERATIONS = 50
+IRR_TOLERANCE = 1e-10
+
+_stats_cache = LRUCache(int(os.environ.get("DCA_STATS_CACHE_SIZE", "2048")))
+
+
+def _days(result):
+    return result.days.astype(np.int64)
+
+
+def purchase_prices(result):
+    # value = units * 終値 なので、各購入時点の終値は value / units で戻せる。
+    # CompactResult (float32) でも計算は float64 で行う
+    return result.value.astype(np.float64) / result.units
+
+
+def drawdowns(result):
+    # 積立による入金を除いた(時間加重の)価格系列に対する、直近高値からの下落率
+    prices = purchase_prices(result)
+    return prices / np.maximum.accumulate(prices) - 1
+
+
+def max_drawdown(result):
+    if not len(result):
+        return None
+    return float(drawdowns(result).min())
+
+
+def cagr(result):
+    # 最初の購入から最後の点まで一括で持っていた場合の年率
+    if len(result) < 2:
+        return None
+    days = _days(result)
+    span = days[-1] - days[0]
+    if span <= 0:
+        return None
+    prices = purchase_prices(result)
+    return float((prices[-1] / prices[0]) ** (DAYS_PER_YEAR / span) - 1)
+
+
+def volatility(result):
+    # 購入間隔ごとの対数リターンの標準偏差を年率換算する
+    if len(result) < 3:
+        return None
+    days = _days(result)
+    periods_per_year = DAYS_PER_YEAR / np.diff(days).mean()
+    returns = np.diff(np.log(purchase_prices(result)))
+    return float(returns.std(ddof=1) * np.sqrt(periods_per_year))
+
+
+def irr(result):
+    # 各回の入金と最終評価額からなるキャッシュフローの内部収益率(年率)。
+    # sum(c_i * (1 + r) ** t_i) = 最終評価額 (t_i は最後の点までの年数) を
+    # x = log(1 + r) についてニュートン法で解く。左辺は x について単調増加で凸
+    if not len(result):
+        return None
+    days = _days(result)
+    years = (days[-1] - days) / DAYS_PER_YEAR
+    contributions = np.diff(result.invested.astype(np.float64), prepend=0.0)
+    final_value = result.final_value
+    if not years.any() or final_value <= 0:
+        return None
+    x = 0.0
+    with np.errstate(all="ignore"):
+        for _ in range(IRR_MAX_ITERATIONS):
+            grown = contributions * np.exp(x * years)
+            f = grown.sum() - final_value
+            step = f / (grown * years).sum()
+            x -= step
+            if not np.isfinite(x):
+                # 極端に短い期間で大きく動いた場合などは発散するので諦める
+                return None
+            if abs(step) < IRR_TOLERANCE:
+                return float(np.expm1(x))
+    return None
+
+
+def time_under_water(result):
+    # 評価額が投資額を下回っていた期間の割合と、最長の連続日数
+    if len(result) < 2:
+        return None, None
+    days = _days(result)
+    under = result.value < result.invested
+    # 各点はその次の点までの期間を代表する
+    durations = np.diff(days)
+    total = days[-1] - days[0]
+    fraction = float(durations[under[:-1]].sum() / total) if total > 0 else 0.0
+
+    edges = np.diff(np.concatenate(([0], under.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.minimum(np.flatnonzero(edges == -1), len(days) - 1)
+    longest = int((days[ends] - days[starts]).max()) if len(starts) else 0
+    return fraction, longest
+
+
+def summarize(result):
+    fraction, longest = time_under_water(result)
+    return {
+        "max_drawdown": max_drawdown(result),
+        "cagr": cagr(result),
+        "irr": irr(result),
+        "volatility": volatility(result),
+        "time_under_water": fraction,
+        "longest_under_water_days": longest,
+    }
+
+
+def cached_summary(key, result):
+    # key はシナリオとデータバージョンを含むこと。同じシナリオでは一度だけ計算する
+    if key is None:
+        return summarize(result)
+    stats = _stats_cache.get(key)
+    if stats is None:
+        stats = summarize(result)
+        _stats_cache.set(key, stats)
+    return stats
+
+
+def cache_stats():
+    return _stats_cache.stats()
+
+
+def reset_cache():
+    _stats_cache.clear()
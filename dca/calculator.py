@@ -1,5 +1,196 @@
+import os
+
+import numpy as np
 import pandas as pd
 
+from dca.downsample import lttb_indices
+from dca.metrics import span
+from dca.views import first_date, get_view
+
+# 既定では計算結果を CompactResult (int32 の日数と float32 の値) で返す。
+# DCA_COMPACT_RESULTS=0 なら常に float64 の DCAResult
+COMPACT_RESULTS = os.environ.get("DCA_COMPACT_RESULTS", "1") == "1"
+
+
+class DCAResult:
+    # 列指向の計算結果。units は累計保有数量、invested は累計投資額
+    __slots__ = ("dates", "value", "units", "invested")
+
+    def __init__(self, dates, value, units, invested):
+        self.dates = dates
+        self.value = value
+        self.units = units
+        self.invested = invested
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def days(self):
+        # エポックからの日数
+        return self.dates.astype("datetime64[D]").astype(np.int64)
+
+    @property
+    def final_value(self):
+        return float(self.value[-1]) if len(self) else 0.0
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in self.__slots__)
+
+    def compact(self):
+        return CompactResult(
+            self.days.astype(np.int32),
+            self.value.astype(np.float32),
+            self.units.astype(np.float32),
+            self.invested.astype(np.float32),
+            self.last(),
+        )
+
+    def last(self):
+        # 最後の点の (value, units, invested)
+        if not len(self):
+            return np.empty(0)
+        return np.array([self.value[-1], self.units[-1], self.invested[-1]])
+
+    def take(self, indices):
+        return DCAResult(
+            self.dates[indices],
+            self.value[indices],
+            self.units[indices],
+            self.invested[indices],
+        )
+
+    def downsample(self, max_points):
+        # 表示用に間引く。合計値などの集計は間引く前の結果から計算すること
+        if max_points is None or len(self) <= max_points:
+            return self
+        x = self.dates.astype("datetime64[D]").astype(np.float64)
+        return self.take(lttb_indices(x, self.value, max_points))
+
+    def to_records(self):
+        # 従来の calculate_returns と同じ list-of-dict 形式
+        dates = pd.DatetimeIndex(self.dates)
+        return [{"date": d, "value": v} for d, v in zip(dates, self.value.tolist())]
+
+
+class CompactResult:
+    # キャッシュに大量に載せるための省メモリ版。日付は int32 の日数、値は float32
+    # (有効数字7桁)で、1点あたり 16 バイト。合計額や satoshi 数がずれないように
+    # 最後の点だけは float64 でも持つ。書き出しには to_result() で float64 に戻す
+    __slots__ = ("days", "value", "units", "invested", "_last")
+
+    def __init__(self, days, value, units, invested, last=None):
+        self.days = days
+        self.value = value
+        self.units = units
+        self.invested = invested
+        self._last = last
+
+    def __len__(self):
+        return len(self.days)
+
+    @property
+    def dates(self):
+        return self.days.astype("datetime64[D]").astype("datetime64[ns]")
+
+    @property
+    def final_value(self):
+        return float(self.last()[0]) if len(self) else 0.0
+
+    @property
+    def nbytes(self):
+        columns = (self.days, self.value, self.units, self.invested)
+        nbytes = sum(column.nbytes for column in columns)
+        if self._last is not None:
+            nbytes += self._last.nbytes
+        return nbytes
+
+    def compact(self):
+        return self
+
+    def last(self):
+        if self._last is not None:
+            return self._last
+        if not len(self):
+            return np.empty(0)
+        return np.array([self.value[-1], self.units[-1], self.invested[-1]], np.float64)
+
+    def to_result(self):
+        # 途中の点は float32 の精度のまま、最後の点は元の float64 の値に戻す
+        columns = [
+            column.astype(np.float64) for column in (self.value, self.units, self.invested)
+        ]
+        if len(self):
+            for column, value in zip(columns, self.last()):
+                column[-1] = value
+        return DCAResult(self.dates, *columns)
+
+    def take(self, indices):
+        indices = np.asarray(indices)
+        # 最後の点を含むなら float64 の値も引き継ぐ
+        keeps_last = len(indices) and indices[-1] == len(self) - 1
+        return CompactResult(
+            self.days[indices],
+            self.value[indices],
+            self.units[indices],
+            self.invested[indices],
+            self._last if keeps_last else None,
+        )
+
+    def downsample(self, max_points):
+        if max_points is None or len(self) <= max_points:
+            return self
+        return self.take(lttb_indices(self.days, self.value, max_points))
+
+    def to_records(self):
+        return self.to_result().to_records()
+
+
+def accumulate(dates, closes, investment_amount):
+    # 終値が欠けている日は購入しない(従来のループと同じ扱い)
+    valid = ~np.isnan(closes)
+    dates = dates[valid]
+    closes = closes[valid]
+    units = np.cumsum(investment_amount / closes)
+    invested = investment_amount * np.arange(1, len(closes) + 1, dtype=np.float64)
+    return DCAResult(dates, units * closes, units, invested)
+
+
+class SweepResult:
+    # 開始日ごとの最終評価額・投資額・騰落率
+    def __init__(self, start_dates, final_value, invested, roi):
+        self.start_dates = start_dates
+        self.final_value = final_value
+        self.invested = invested
+        self.roi = roi
+
+    def __len__(self):
+        return len(self.start_dates)
+
+
+@span("sweep")
+def sweep_start_dates(historical_data, investment_amount, timeframe, accumulate_years=None):
+    # すべての開始日について DCA の結果を一度に計算する。
+    # 1/価格 の累積和を取っておけば、任意の区間の保有数量は差分で求まる
+    view = get_view(historical_data, timeframe)
+    dates = view.dates
+    closes = view.closes
+    n = len(closes)
+
+    prefix = np.concatenate(([0.0], np.cumsum(1.0 / closes)))
+    starts = np.arange(n)
+    if accumulate_years:
+        end_dates = pd.DatetimeIndex(dates) + pd.DateOffset(years=accumulate_years)
+        ends = np.searchsorted(dates, end_dates.to_numpy(), side="right") - 1
+    else:
+        ends = np.full(n, n - 1)
+
+    units = investment_amount * (prefix[ends + 1] - prefix[starts])
+    final_value = units * closes[ends]
+    invested = investment_amount * (ends - starts + 1).astype(np.float64)
+    return SweepResult(dates, final_value, invested, final_value / invested - 1)
+
 
 class DCA_Calculator:
     def __init__(
@@ -9,47 +200,38 @@ class DCA_Calculator:
         historical_data,
         start_date=None,
         accumulate_years=None,
+        anchor=None,
     ):
         self.investment_amount = investment_amount
         self.timeframe = timeframe
         self.historical_data = historical_data
-        # 開始日が指定されていなければ、データの最初の日付を使用
+        # 開始日が指定されていなければ、データの最初の日付を使用。
+        # historical_data は DataFrame または PriceColumns
         self.start_date = (
-            pd.to_datetime(start_date) if start_date else historical_data.index.min()
+            pd.to_datetime(start_date) if start_date else first_date(historical_data)
         )
         self.accumulate_years = accumulate_years
+        # 曜日(week)や日(month)を固定して買う場合の指定。None なら各期間の最初の取引日
+        self.anchor = anchor
 
-    def calculate_returns(self):
-        returns = []
-        total_units = 0
-        # 指定された期間に合わせてデータをリサンプリング
-        if self.timeframe == "week":
-            resampled = self.historical_data.resample("W").first()
-        elif self.timeframe == "month":
-            resampled = self.historical_data.resample("M").first()
-        elif self.timeframe == "day":
-            resampled = self.historical_data
-        else:
-            resampled = self.historical_data.resample("Y").first()
+    @span("calculate")
+    def calculate(self, compact=None):
+        # compact=False なら float64 の DCAResult を返す(CSV などへの書き出し用)
+        view = get_view(self.historical_data, self.timeframe, self.anchor)
 
         # 対象期間に絞り込む
-        resampled = resampled[resampled.index >= self.start_date]
+        end_date = None
         if self.accumulate_years:
             end_date = self.start_date + pd.DateOffset(years=self.accumulate_years)
-            resampled = resampled[resampled.index <= end_date]
-
-        for date, row in resampled.iterrows():
-            price = row["Close"]
-            if isinstance(price, pd.Series):
-                price = price.iloc[0]
-            if pd.isna(price):
-                continue
-            units = self.investment_amount / price
-            total_units += units
-            current_value = total_units * price
-            returns.append({"date": date, "value": current_value})
-
-        return returns
+        dates, closes = view.slice(self.start_date, end_date)
+
+        result = accumulate(dates, closes, self.investment_amount)
+        if compact is None:
+            compact = COMPACT_RESULTS
+        return result.compact() if compact else result
+
+    def calculate_returns(self):
+        return self.calculate(compact=False).to_records()
 
     def get_investment_data(self):
         return self.historical_data
@@ -0,0 +1,36 @@
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:
+    # brotli は任意。入っていなければ gzip だけを使う
+    brotli = None
+
+MIN_SIZE = int(os.environ.get("DCA_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.environ.get("DCA_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.environ.get("DCA_BROTLI_QUALITY", "5"))
+COMPRESSIBLE_TYPES = ("text/html", "application/json")
+
+
+def available_encodings():
+    # 同じ優先度なら先にあるものを選ぶ
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def choose_encoding(accept_encodings):
+    # accept_encodings は werkzeug の Accept (request.accept_encodings)
+    best = None
+    best_quality = 0
+    for encoding in available_encodings():
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    # mtime を固定して、同じ内容なら同じバイト列にする
+    return gzip.compress(data, GZIP_LEVEL, mtime=0)
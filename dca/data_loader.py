@@ -1,27 +1,253 @@
-def load_data(source):
-    import yfinance as yf
-    import pandas as pd
-
-    if source == "MSTR":
-        df = yf.download("MSTR", start="2010-01-01")
-        df.reset_index(inplace=True)
-        df["Date"] = pd.to_datetime(df["Date"])
-        df.set_index("Date", inplace=True)
-        return df
-    elif source == "BTC-USD":
-        df = yf.download("BTC-USD", start="2010-01-01")
-        df.reset_index(inplace=True)
-        df["Date"] = pd.to_datetime(df["Date"])
-        df.set_index("Date", inplace=True)
-        return df
-
-    if source.endswith(".csv"):
-        data = pd.read_csv(source)
-    else:
+import hashlib
+import os
+import threading
+import time as time_module
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+from dca.cache import TTLCache
+from dca.ingest import read_prices_csv
+from dca.metrics import span
+from dca.mmap_store import open_columns, write_columns
+from dca.price_store import PriceStore
+from dca.views import TIMEFRAMES, PriceViews
+
+TICKERS = ("MSTR", "BTC-USD")
+
+# 株式は取引時間中のみ値が動く。BTC-USD は 24 時間動くので固定 TTL
+MARKET_TICKERS = ("MSTR",)
+MARKET_TZ = ZoneInfo("America/New_York")
+MARKET_OPEN = time(9, 30)
+MARKET_CLOSE = time(16, 0)
+
+CACHE_TTL = float(os.environ.get("DCA_CACHE_TTL", "900"))
+CSV_DTYPE = os.environ.get("DCA_CSV_DTYPE", "float64")
+CSV_ENGINE = os.environ.get("DCA_CSV_ENGINE", "auto")
+MMAP_ENABLED = os.environ.get("DCA_MMAP", "1") == "1"
+LOAD_TIMEOUT = float(os.environ.get("DCA_LOAD_TIMEOUT", "20"))
+LOAD_RETRIES = int(os.environ.get("DCA_LOAD_RETRIES", "1"))
+
+_store = PriceStore()
+
+
+def configure_store(directory=None, fetcher=None):
+    # 保存先やデータ取得元(yfinance / CSV フィクスチャ)を差し替える
+    global _store
+    _store = PriceStore(directory or _store.directory, fetcher or _store.fetcher)
+    reset_cache()
+    return _store
+
+
+def mmap_dir():
+    return os.environ.get("DCA_MMAP_DIR") or os.path.join(_store.directory, "columns")
+
+
+def reset_cache():
+    _cache.invalidate()
+    _snapshots.clear()
+
+
+def _next_market_open(now):
+    day = now.date()
+    if now.time() >= MARKET_OPEN:
+        day += timedelta(days=1)
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return datetime.combine(day, MARKET_OPEN, tzinfo=MARKET_TZ)
+
+
+def market_is_open(now=None):
+    now = now or datetime.now(MARKET_TZ)
+    return now.weekday() < 5 and MARKET_OPEN <= now.time() < MARKET_CLOSE
+
+
+def cache_ttl(source, now=None):
+    if source not in MARKET_TICKERS:
+        return CACHE_TTL
+    now = now or datetime.now(MARKET_TZ)
+    if market_is_open(now):
+        # 取引時間中は通常の TTL、ただし終値が確定したら取り直す
+        close = datetime.combine(now.date(), MARKET_CLOSE, tzinfo=MARKET_TZ)
+        return min(CACHE_TTL, (close - now).total_seconds() + 60)
+    # 取引時間外は次の寄り付きまで値が変わらない
+    return max(CACHE_TTL, (_next_market_open(now) - now).total_seconds())
+
+
+_cache = TTLCache(cache_ttl)
+
+
+def cache_stats():
+    return _cache.stats()
+
+
+@span("load_data")
+def _load_uncached(source):
+    if source in TICKERS:
+        return _store.refresh(source)
+
+    if not source.endswith(".csv"):
         raise ValueError("Unsupported data source format. Please provide a CSV file.")
 
-    # Process the data as needed
-    data["Date"] = pd.to_datetime(data["Date"])
-    data.set_index("Date", inplace=True)
+    # 日付は読み込み時にパースし、終値以外の列は読まない
+    return read_prices_csv(source, dtype=CSV_DTYPE, engine=CSV_ENGINE)
+
+
+class PriceSnapshot:
+    # ある時点のデータとそのバージョン。version はデータの中身から決まる。
+    # 公開後のスナップショットは変更せず、更新時は新しいものに差し替える。
+    # memmap した列がある場合は DataFrame を持たず、frame は初めて使われたときに読む
+    def __init__(self, frame, version, loaded_at, columns=None, load_frame=None):
+        self._frame = frame
+        self._load_frame = load_frame
+        self._frame_lock = threading.Lock()
+        self.version = version
+        self.loaded_at = loaded_at
+        self.columns = columns
+        # 計算用の価格データ。memmap した列があればそちらを使う。
+        # 期間ごとのビューはこのスナップショット(バージョン)に紐づけて使い回す
+        self.views = PriceViews(columns if columns is not None else frame, version)
+
+    @property
+    def frame(self):
+        if self._frame is None:
+            with self._frame_lock:
+                if self._frame is None:
+                    self._frame = self._load_frame()
+        return self._frame
+
+
+def data_version(frame):
+    if frame.empty:
+        return "empty"
+    last = frame.iloc[-1]
+    digest = hashlib.sha1(repr((len(frame), str(frame.index[-1]), last.tolist())).encode())
+    return digest.hexdigest()[:16]
+
+
+_snapshots = {}
+
+
+def _stored_frame(source, version, columns):
+    # 保存済みの全列を読み直す。その間に更新されていたら、
+    # スナップショットと食い違わないように memmap した終値から作る
+    frame = _store.read(source)
+    if frame is not None and data_version(frame) == version:
+        return frame
+    index = pd.DatetimeIndex(np.asarray(columns.dates), name="Date")
+    return pd.DataFrame({"Close": np.asarray(columns.closes)}, index=index)
+
+
+def _load_snapshot_uncached(source):
+    data = _load_uncached(source)
+    version = data_version(data)
+    previous = _snapshots.get(source)
+    if previous is not None and previous.version == version:
+        # 中身が変わっていなければ前回のスナップショット(とビュー)をそのまま使う
+        return previous
+    loaded_at = datetime.now(timezone.utc)
+    if source in TICKERS and MMAP_ENABLED:
+        # 日付と終値をバイナリで書き出して memmap で開き直す。同じファイルを開いた
+        # 全ワーカーでページが共有される。同じ版が既にディスクにあれば書かない。
+        # DataFrame はここで手放し、必要になったときだけ読み直す
+        directory = mmap_dir()
+        write_columns(directory, source, version, data)
+        columns = open_columns(directory, source, version)
+        del data
+        snapshot = PriceSnapshot(
+            None,
+            version,
+            loaded_at,
+            columns,
+            lambda: _stored_frame(source, version, columns),
+        )
+    else:
+        snapshot = PriceSnapshot(data, version, loaded_at)
+    # 期間ごとのリサンプリング結果はロード時に一度だけ作っておく
+    for timeframe in TIMEFRAMES:
+        snapshot.views[timeframe]
+    # dict の要素の差し替えはアトミックなので、読み手は常に古いか新しいかのどちらかを見る
+    _snapshots[source] = snapshot
+    return snapshot
+
+
+_refresh_thread = None
+
+
+def set_background_refresh(thread):
+    # バックグラウンド更新のスレッドがこのプロセスで動いている間は、
+    # 公開済みのスナップショットがあればリクエスト側では期限切れでも読み込み直さない。
+    # fork 後の子プロセスではスレッドが動いていないので、通常の TTL に戻る
+    global _refresh_thread
+    _refresh_thread = thread
+
+
+def background_refresh_active():
+    thread = _refresh_thread
+    return thread is not None and thread.is_alive()
+
+
+def refresh_snapshot(source):
+    snapshot = _load_snapshot_uncached(source)
+    _cache.set(source, snapshot)
+    return snapshot
+
+
+def load_snapshot(source):
+    if background_refresh_active():
+        snapshot = _snapshots.get(source)
+        if snapshot is not None:
+            return snapshot
+    return _cache.get_or_load(source, lambda: _load_snapshot_uncached(source))
+
+
+def load_data(source):
+    # 返す DataFrame はリクエスト間で共有されるので、呼び出し側で変更しないこと
+    return load_snapshot(source).frame
+
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="dca-loader")
+
+
+def _load_snapshot_with_retries(source, retries, backoff):
+    for attempt in range(retries + 1):
+        try:
+            return load_snapshot(source)
+        except Exception:
+            if attempt == retries:
+                raise
+            time_module.sleep(backoff * 2**attempt)
+
+
+def load_snapshots(sources, timeout=LOAD_TIMEOUT, retries=LOAD_RETRIES, backoff=0.5):
+    # 複数のソースを並行して読み込む。timeout は秒数、または {source: 秒数}。
+    # 失敗・タイムアウトしたソースは errors に入れ、取れた分だけ返す
+    futures = {
+        source: _executor.submit(_load_snapshot_with_retries, source, retries, backoff)
+        for source in sources
+    }
+    started = time_module.monotonic()
+    snapshots = {}
+    errors = {}
+    for source, future in futures.items():
+        limit = timeout.get(source, LOAD_TIMEOUT) if isinstance(timeout, dict) else timeout
+        remaining = None
+        if limit is not None:
+            remaining = max(0.0, limit - (time_module.monotonic() - started))
+        try:
+            snapshots[source] = future.result(remaining)
+        except FutureTimeoutError:
+            # 読み込み自体は裏で続き、終わればキャッシュに入る
+            errors[source] = TimeoutError(f"Loading {source} timed out after {limit}s")
+        except Exception as e:
+            errors[source] = e
+    return snapshots, errors
+
 
-    return data
+def load_many(sources, timeout=LOAD_TIMEOUT, retries=LOAD_RETRIES):
+    snapshots, errors = load_snapshots(sources, timeout, retries)
+    return {source: snapshot.frame for source, snapshot in snapshots.items()}, errors
@@ -0,0 +1,39 @@
+import numpy as np
+
+# 先頭・末尾・最大値・最小値を残すのに必要な点数
+MIN_POINTS = 4
+
+
+def lttb_indices(x, y, max_points):
+    # Largest-Triangle-Three-Buckets で残す点のインデックスを返す。
+    # 先頭・末尾と最大値・最小値の点は必ず残し、全体で max_points 点以下にする
+    n = len(x)
+    if max_points is None or n <= max_points:
+        return np.arange(n)
+    if max_points < MIN_POINTS:
+        raise ValueError(f"max_points must be at least {MIN_POINTS}")
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # 端点と重ならない最大値・最小値の分だけバケットを減らす
+    extrema = {int(np.argmax(y)), int(np.argmin(y))} - {0, n - 1}
+    threshold = max_points - len(extrema)
+
+    # 先頭と末尾を除いた点を threshold - 2 個のバケットに分ける
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # 次のバケットの平均点(最後のバケットでは末尾の点)
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return np.union1d(selected, np.fromiter(extrema, dtype=np.int64))
@@ -0,0 +1,171 @@
+import itertools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+
+from dca import data_loader
+from dca.calculator import DCA_Calculator
+from dca.mmap_store import open_views, write_columns
+
+GRID_KEYS = ("source", "timeframe", "investment", "start_date", "accumulate_years")
+GRID_DEFAULTS = {
+    "source": ["MSTR"],
+    "timeframe": ["week"],
+    "investment": [10.0],
+    "start_date": ["2020-08-01"],
+    "accumulate_years": [None],
+}
+MAX_WORKERS = int(os.environ.get("DCA_GRID_WORKERS", str(os.cpu_count() or 1)))
+MAX_SCENARIOS = int(os.environ.get("DCA_GRID_MAX_SCENARIOS", "200000"))
+
+
+def _axis(value):
+    # 単独の値も1要素のリストとして扱う
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+def _expand_dates(value):
+    # {"start": ..., "end": ..., "freq": "MS"} の形なら日付の範囲に展開する
+    if isinstance(value, dict):
+        dates = pd.date_range(value["start"], value["end"], freq=value.get("freq", "MS"))
+        return [date.strftime("%Y-%m-%d") for date in dates]
+    return _axis(value)
+
+
+def _accumulate_years(value):
+    # 0 / None は最後まで積み立てる。端数の年数は黙って切り捨てずにエラーにする
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"accumulate_years must be a whole number of years, got {value!r}")
+    if value < 0 or value != int(value):
+        raise ValueError(f"accumulate_years must be a whole number of years, got {value!r}")
+    return int(value) or None
+
+
+def expand_grid(grid):
+    unknown = set(grid) - set(GRID_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown grid keys: {', '.join(sorted(unknown))}")
+    axes = {key: _axis(grid.get(key, GRID_DEFAULTS[key])) for key in GRID_KEYS}
+    axes["start_date"] = _expand_dates(grid.get("start_date", GRID_DEFAULTS["start_date"]))
+    axes["accumulate_years"] = [_accumulate_years(value) for value in axes["accumulate_years"]]
+    unknown_sources = set(axes["source"]) - set(data_loader.TICKERS)
+    if unknown_sources:
+        raise ValueError(f"Unknown sources: {', '.join(sorted(unknown_sources))}")
+    total = 1
+    for values in axes.values():
+        total *= len(values)
+    if total > MAX_SCENARIOS:
+        raise ValueError(f"Grid has {total} scenarios, the limit is {MAX_SCENARIOS}")
+    return [dict(zip(GRID_KEYS, values)) for values in itertools.product(*axes.values())]
+
+
+def prepare_columns(sources):
+    # ワーカーが memmap で開く列ファイルを用意して、そのディレクトリを返す
+    directory = data_loader.mmap_dir()
+    for source in sources:
+        snapshot = data_loader.load_snapshot(source)
+        if snapshot.columns is None:
+            write_columns(directory, source, snapshot.version, snapshot.frame)
+    return directory
+
+
+def calculate_scenario(directory, scenario):
+    # 同じプロセス内では同じ memmap を使い回す(ページは全プロセスで共有)
+    prices = open_views(directory, scenario["source"])
+    return DCA_Calculator(
+        float(scenario["investment"]),
+        scenario["timeframe"],
+        prices,
+        scenario["start_date"],
+        scenario["accumulate_years"],
+    ).calculate(compact=False)
+
+
+def scenario_summary(scenario, result):
+    invested = float(result.invested[-1]) if len(result) else 0.0
+    final_value = result.final_value
+    return {
+        **scenario,
+        "purchases": len(result),
+        "invested": invested,
+        "final_value": final_value,
+        "roi": final_value / invested - 1 if invested > 0 else None,
+    }
+
+
+def run_scenario(directory, scenario):
+    try:
+        return scenario_summary(scenario, calculate_scenario(directory, scenario))
+    except Exception as e:
+        return {**scenario, "error": str(e)}
+
+
+def run_chunk(directory, scenarios):
+    return [run_scenario(directory, scenario) for scenario in scenarios]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    # Web サーバーのスレッドから fork しないように spawn で起動する
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                MAX_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def check_chunk_size(chunk_size):
+    chunk_size = int(chunk_size)
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    return chunk_size
+
+
+def run_grid(
+    scenarios,
+    directory,
+    pool=None,
+    chunk_size=256,
+    max_in_flight=None,
+    chunk_fn=run_chunk,
+):
+    # チャンクごとにプロセスプールへ投げ、終わった順に結果を返す。
+    # 同時に投げるチャンク数を max_in_flight までに抑える。
+    # chunk_fn(directory, scenarios) はワーカーで実行するのでモジュールの関数にすること。
+    # 引数の誤りは結果を返し始める前(呼び出した時点)で ValueError にする
+    chunk_size = check_chunk_size(chunk_size)
+    pool = pool or get_pool()
+    max_in_flight = max_in_flight or 2 * MAX_WORKERS
+    return _results(scenarios, directory, pool, chunk_size, max_in_flight, chunk_fn)
+
+
+def _results(scenarios, directory, pool, chunk_size, max_in_flight, chunk_fn):
+    chunks = (
+        scenarios[i : i + chunk_size] for i in range(0, len(scenarios), chunk_size)
+    )
+    pending = set()
+    try:
+        for chunk in chunks:
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+            pending.add(pool.submit(chunk_fn, directory, chunk))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+    finally:
+        # 途中で打ち切られたら(クライアント切断など)残りは取り消す
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,44 @@
+import importlib.util
+
+import pandas as pd
+
+# 計算で使うのは終値だけなので、既定ではそれ以外の列を読まない
+DEFAULT_COLUMNS = ("Close",)
+
+
+def _resolve_engine(engine):
+    if engine != "auto":
+        return engine
+    if importlib.util.find_spec("pyarrow") is not None:
+        return "pyarrow"
+    return "c"
+
+
+def _finish(frame, date_column):
+    frame = frame.set_index(date_column)
+    if not frame.index.is_monotonic_increasing:
+        frame = frame.sort_index()
+    return frame
+
+
+def read_prices_csv(
+    path,
+    columns=DEFAULT_COLUMNS,
+    dtype="float64",
+    engine="auto",
+    date_column="Date",
+):
+    # 必要な列だけを読み、日付は読み込み時にパースし、価格列の型を固定する。
+    # columns=None なら全列を読む。dtype は列名から型への dict でもよい
+    usecols = None if columns is None else [date_column, *columns]
+    if not isinstance(dtype, dict):
+        dtype = None if columns is None else {column: dtype for column in columns}
+    frame = pd.read_csv(
+        path,
+        usecols=usecols,
+        parse_dates=[date_column],
+        dtype=dtype,
+        engine=_resolve_engine(engine),
+    )
+    return _finish(frame, date_column)
+
@@ -0,0 +1,143 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from dca.views import PriceColumns, PriceViews, close_prices
+
+# 銘柄ごとに <ticker>/<version>/ に dates.M8ns (datetime64[ns]) と close.f64 (終値) の
+# 2 ファイルを置く。どちらもヘッダーなしのリトルエンディアン配列。
+# <ticker>/current はいま公開中のバージョンを指すシンボリックリンク
+DATES_FILE = "dates.M8ns"
+CLOSE_FILE = "close.f64"
+CURRENT = "current"
+# 古いバージョンは、まだ開いているプロセスのために少しだけ残しておく
+KEEP_VERSIONS = 3
+# これより古い一時ディレクトリは書き手が落ちたものとみなして消す
+STALE_TMP_SECONDS = 3600
+
+
+def version_dir(directory, ticker, version):
+    return os.path.join(directory, ticker, version)
+
+
+def frame_to_columns(frame):
+    # 終値が欠けている行はここで除く。読む側はマップした配列をそのまま使える
+    closes = close_prices(frame)
+    valid = ~np.isnan(closes)
+    dates = frame.index.to_numpy().astype("<M8[ns]")
+    return PriceColumns(dates[valid], closes[valid].astype("<f8"))
+
+
+def _write_version(directory, ticker, version, frame):
+    # 書き手ごとの一時ディレクトリに書いてから、バージョンのディレクトリへ rename する。
+    # 同じバージョンを別のプロセスが先に書いていたら、こちらは捨てる
+    target = version_dir(directory, ticker, version)
+    if os.path.isdir(target):
+        return target
+    columns = frame_to_columns(frame)
+    tmp_dir = tempfile.mkdtemp(prefix=".tmp-", dir=os.path.dirname(target))
+    try:
+        columns.dates.tofile(os.path.join(tmp_dir, DATES_FILE))
+        columns.closes.tofile(os.path.join(tmp_dir, CLOSE_FILE))
+        os.chmod(tmp_dir, 0o755)
+        os.rename(tmp_dir, target)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.isdir(target):
+            raise
+    return target
+
+
+def _publish(directory, ticker, version):
+    # current を一度の rename で差し替えるので、読み手は日付と終値を必ず同じ版で開く
+    link = os.path.join(directory, ticker, CURRENT)
+    tmp_link = os.path.join(
+        directory, ticker, f".{CURRENT}-{os.getpid()}-{threading.get_ident()}"
+    )
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+    os.symlink(version, tmp_link)
+    os.replace(tmp_link, link)
+
+
+def _prune(directory, ticker):
+    base = os.path.join(directory, ticker)
+    current = os.readlink(os.path.join(base, CURRENT))
+    now = time.time()
+    versions = []
+    for entry in os.scandir(base):
+        try:
+            if entry.name.startswith((".tmp-", f".{CURRENT}-")):
+                # 途中で落ちた書き手の一時ディレクトリ・リンク。書き込み中のものは残す
+                if now - entry.stat(follow_symlinks=False).st_mtime > STALE_TMP_SECONDS:
+                    if entry.is_dir(follow_symlinks=False):
+                        shutil.rmtree(entry.path, ignore_errors=True)
+                    else:
+                        os.remove(entry.path)
+            elif (
+                entry.is_dir(follow_symlinks=False)
+                and not entry.name.startswith(".")
+                and entry.name != current
+            ):
+                versions.append((entry.stat(follow_symlinks=False).st_mtime_ns, entry.path))
+        except FileNotFoundError:
+            # 同じ銘柄を別のプロセスも同時に片付けているので、先に消されたものは飛ばす
+            continue
+    versions.sort(reverse=True)
+    # 削除しても、既に memmap しているプロセスの中身はそのまま読める
+    for _, path in versions[KEEP_VERSIONS - 1 :]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def write_columns(directory, ticker, version, frame):
+    # ディスク上に同じバージョンがあれば書かずに current を向け直すだけ
+    os.makedirs(os.path.join(directory, ticker), exist_ok=True)
+    _write_version(directory, ticker, version, frame)
+    _publish(directory, ticker, version)
+    _prune(directory, ticker)
+    return version
+
+
+def _open(path, dtype):
+    if os.path.getsize(path) == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+
+_opened = {}
+_opened_lock = threading.Lock()
+
+
+def _open_version(directory, ticker, version=None):
+    # 読み取り専用で memmap する。ページは OS のページキャッシュ経由で
+    # 全ワーカープロセスから共有される。version を省略すると公開中の版を開く。
+    # バージョンのディレクトリは書き換えないので、版ごとに一度だけ開けばよい
+    if version is None:
+        version = os.readlink(os.path.join(directory, ticker, CURRENT))
+    key = (directory, ticker)
+    with _opened_lock:
+        cached = _opened.get(key)
+        if cached is not None and cached.version == version:
+            return cached
+        path = version_dir(directory, ticker, version)
+        columns = PriceColumns(
+            _open(os.path.join(path, DATES_FILE), "<M8[ns]"),
+            _open(os.path.join(path, CLOSE_FILE), "<f8"),
+        )
+        if len(columns.dates) != len(columns.closes):
+            raise ValueError(f"Column files for {ticker} have different lengths")
+        views = _opened[key] = PriceViews(columns, version)
+        return views
+
+
+def open_columns(directory, ticker, version=None):
+    return _open_version(directory, ticker, version).data
+
+
+def open_views(directory, ticker, version=None):
+    # 期間ごとのビューも版ごとに一度だけ作る
+    return _open_version(directory, ticker, version)
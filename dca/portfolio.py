@@ -0,0 +1,126 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from dca.cache import LRUCache
+from dca.calculator import COMPACT_RESULTS, DCAResult
+from dca.metrics import span
+from dca.views import PriceViews, date_bounds, first_date, get_view
+
+
+class AlignedPrices:
+    # 複数資産の終値を共通のカレンダーに並べた (日付 × 資産) の行列。
+    # その資産に値がない日は NaN
+    def __init__(self, dates, closes):
+        self.dates = dates
+        self.closes = closes
+
+    @classmethod
+    def from_views(cls, views):
+        dates = np.unique(np.concatenate([view.dates for view in views]))
+        closes = np.full((len(dates), len(views)), np.nan)
+        for j, view in enumerate(views):
+            closes[np.searchsorted(dates, view.dates), j] = view.closes
+        return cls(dates, closes)
+
+    def slice(self, start=None, end=None):
+        lo, hi = date_bounds(self.dates, start, end)
+        return self.dates[lo:hi], self.closes[lo:hi]
+
+
+_aligned = LRUCache(int(os.environ.get("DCA_ALIGNED_CACHE_SIZE", "64")))
+
+
+def align(frames, timeframe, anchor=None):
+    # スナップショットのビュー (PriceViews) の組み合わせはデータのバージョンごとに
+    # 一度だけ揃える。それ以外のデータは書き換えられうるので毎回揃える
+    cacheable = all(
+        isinstance(frame, PriceViews) and frame.version is not None for frame in frames
+    )
+    key = (timeframe, anchor) + tuple(getattr(frame, "version", None) for frame in frames)
+    aligned = _aligned.get(key) if cacheable else None
+    if aligned is None:
+        views = [get_view(frame, timeframe, anchor) for frame in frames]
+        aligned = AlignedPrices.from_views(views)
+        if cacheable:
+            _aligned.set(key, aligned)
+    return aligned
+
+
+def reset_cache():
+    _aligned.clear()
+
+
+class PortfolioResult:
+    # value / invested はポートフォリオ全体、assets は資産ごとの DCAResult
+    # (compact なら CompactResult)
+    def __init__(self, dates, value, invested, assets):
+        self.dates = dates
+        self.value = value
+        self.invested = invested
+        self.assets = assets
+
+    def __getitem__(self, ticker):
+        return self.assets[ticker]
+
+    def __len__(self):
+        return len(self.dates)
+
+
+class Portfolio:
+    def __init__(self, weights):
+        # weights: {ticker: 配分比率}。各回の購入額は investment_amount * 比率
+        self.tickers = list(weights)
+        self.weights = np.array([weights[t] for t in self.tickers], dtype=np.float64)
+
+    @span("portfolio")
+    def calculate(
+        self,
+        frames,
+        investment_amount,
+        timeframe,
+        start_date=None,
+        accumulate_years=None,
+        anchor=None,
+        compact=None,
+    ):
+        if compact is None:
+            compact = COMPACT_RESULTS
+        frames = [frames[ticker] for ticker in self.tickers]
+        aligned = align(frames, timeframe, anchor)
+
+        # 開始日が指定されていなければ、いずれかの資産の最初の日付を使用
+        start_date = (
+            pd.to_datetime(start_date)
+            if start_date
+            else min(first_date(frame) for frame in frames)
+        )
+        end_date = None
+        if accumulate_years:
+            end_date = start_date + pd.DateOffset(years=accumulate_years)
+        dates, closes = aligned.slice(start_date, end_date)
+
+        # 全資産を (日付 × 資産) の行列で一度に計算する。値のない日は購入しない
+        valid = ~np.isnan(closes)
+        amounts = investment_amount * self.weights
+        units = np.cumsum(np.where(valid, amounts / closes, 0.0), axis=0)
+        invested = np.cumsum(valid * amounts, axis=0)
+
+        # ポートフォリオ全体は各資産の直近の終値で評価する
+        rows = np.arange(len(dates))[:, None]
+        last = np.maximum.accumulate(np.where(valid, rows, 0), axis=0)
+        marks = np.take_along_axis(closes, last, axis=0)
+        value = np.where(units > 0, units * marks, 0.0).sum(axis=1)
+
+        assets = {}
+        for j, ticker in enumerate(self.tickers):
+            mask = valid[:, j]
+            result = DCAResult(
+                dates[mask],
+                units[mask, j] * closes[mask, j],
+                units[mask, j],
+                invested[mask, j],
+            )
+            assets[ticker] = result.compact() if compact else result
+        return PortfolioResult(dates, value, invested.sum(axis=1), assets)
@@ -0,0 +1,184 @@
+import logging
+import os
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+from dca.ingest import read_prices_csv
+from dca.metrics import span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_START = "2010-01-01"
+# 取り直した確定済みのバーの終値がこれ以上ずれていたら、分割などで
+# 過去分が遡って調整されたとみなして全期間を取り直す
+ADJUSTMENT_TOLERANCE = 1e-6
+# 保存ファイルの価格列は float64 で読む(型の推論を省く)。出来高などはそのまま
+PRICE_COLUMNS = ("Open", "High", "Low", "Close", "Adj Close")
+DEFAULT_STORE_DIR = os.environ.get(
+    "DCA_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data"),
+)
+
+
+def _normalize(df):
+    # yfinance は (Price, Ticker) の MultiIndex 列を返すことがあるので平坦化する
+    if isinstance(df.columns, pd.MultiIndex):
+        df = df.droplevel(-1, axis=1)
+    df = df.copy()
+    df.index = pd.to_datetime(df.index)
+    df.index.name = "Date"
+    df = df[~df.index.duplicated(keep="last")]
+    return df.sort_index()
+
+
+class PriceFetcher:
+    def fetch(self, ticker, start):
+        raise NotImplementedError
+
+
+class YFinanceFetcher(PriceFetcher):
+    def fetch(self, ticker, start):
+        import yfinance as yf
+
+        return _normalize(yf.download(ticker, start=start))
+
+
+class CSVFetcher(PriceFetcher):
+    # <directory>/<ticker>.csv を読む。オフライン実行やテスト用
+    def __init__(self, directory):
+        self.directory = directory
+
+    def fetch(self, ticker, start):
+        path = os.path.join(self.directory, f"{ticker}.csv")
+        df = _normalize(read_prices_csv(path, columns=None))
+        return df[df.index >= pd.Timestamp(start)]
+
+
+def default_fetcher():
+    fixture_dir = os.environ.get("DCA_FIXTURE_DIR")
+    if fixture_dir:
+        return CSVFetcher(fixture_dir)
+    return YFinanceFetcher()
+
+
+class PriceStore:
+    def __init__(self, directory=DEFAULT_STORE_DIR, fetcher=None):
+        self.directory = directory
+        self.fetcher = fetcher or default_fetcher()
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        # 銘柄ごとの (ファイルの stat, 読んだ DataFrame)
+        self._stored = {}
+
+    def path(self, ticker):
+        return os.path.join(self.directory, f"{ticker}.csv")
+
+    def read(self, ticker):
+        path = self.path(ticker)
+        if not os.path.exists(path):
+            return None
+        # 全列を残す(書き戻すときに落とさない)が、価格列の型は固定する
+        header = pd.read_csv(path, nrows=0).columns
+        dtype = {column: "float64" for column in header if column in PRICE_COLUMNS}
+        return read_prices_csv(path, columns=None, dtype=dtype)
+
+    def _read_unchanged(self, ticker):
+        # 前回の更新から誰もファイルを書き換えていなければ、読み直さずに前回の結果を使う。
+        # 書き込みは rename で差し替えるので inode で判別できる
+        try:
+            st = os.stat(self.path(ticker))
+        except FileNotFoundError:
+            return None
+        key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        cached = self._stored.get(ticker)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        frame = self.read(ticker)
+        if frame is not None:
+            self._stored[ticker] = (key, frame)
+        return frame
+
+    def refresh(self, ticker):
+        with self._lock_for(ticker):
+            with span("store_read"):
+                stored = self._read_unchanged(ticker)
+            if stored is None or stored.empty:
+                start = DEFAULT_START
+            elif len(stored) < 2:
+                # 最終日のバーは取引時間中に更新されるので、その日から取り直す
+                start = stored.index[-1].strftime("%Y-%m-%d")
+            else:
+                # 確定済みのバーを1本重ねて取り、過去分が調整されていないか確かめる
+                start = stored.index[-2].strftime("%Y-%m-%d")
+
+            refetch_all = False
+            try:
+                with span("fetch"):
+                    fresh = self.fetcher.fetch(ticker, start)
+                    if stored is not None and len(stored) >= 2 and self._adjusted(stored, fresh):
+                        logger.info("history of %s was adjusted, refetching all", ticker)
+                        fresh = self.fetcher.fetch(ticker, DEFAULT_START)
+                        refetch_all = True
+            except Exception:
+                if stored is None:
+                    raise
+                logger.warning("refresh of %s failed, serving stored data", ticker, exc_info=True)
+                return stored
+
+            if fresh is None or fresh.empty:
+                if stored is None:
+                    raise ValueError(f"No price data available for {ticker}")
+                return stored
+
+            if stored is not None and not stored.empty and not refetch_all:
+                if fresh.equals(stored[stored.index >= fresh.index[0]]):
+                    # 新しいバーも値の変更もなければ書き直さない(他のワーカーも読み直さずに済む)
+                    return stored
+                frame = pd.concat([stored[stored.index < fresh.index[0]], fresh])
+            else:
+                frame = fresh
+            with span("store_write"):
+                self._write(ticker, frame)
+            return frame
+
+    @staticmethod
+    def _adjusted(stored, fresh):
+        # 重ねて取った確定済みのバーが取れていないか、終値が変わっていれば True
+        if fresh is None or fresh.empty:
+            return False
+        overlap = stored.index[-2]
+        if overlap not in fresh.index:
+            return True
+        return not np.isclose(
+            fresh.at[overlap, "Close"],
+            stored.at[overlap, "Close"],
+            rtol=ADJUSTMENT_TOLERANCE,
+            atol=0.0,
+        )
+
+    def _write(self, ticker, frame):
+        # 一時ファイルは書き手ごとに別名にする(複数のワーカープロセスが同時に書く)
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=f".{ticker}.", suffix=".tmp", dir=self.directory
+        )
+        try:
+            # mkstemp は 0600 で作るので、通常のファイルと同じ権限に戻す
+            os.chmod(tmp_path, 0o644)
+            with os.fdopen(fd, "w", newline="") as f:
+                frame.to_csv(f)
+            # rename しても inode と更新時刻は変わらないので、次回はこのまま使える
+            st = os.stat(tmp_path)
+            os.replace(tmp_path, self.path(ticker))
+            self._stored[ticker] = ((st.st_ino, st.st_mtime_ns, st.st_size), frame)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _lock_for(self, ticker):
+        with self._locks_guard:
+            return self._locks.setdefault(ticker, threading.Lock())
@@ -0,0 +1,82 @@
+import logging
+import os
+import threading
+import time
+
+from dca import data_loader
+
+logger = logging.getLogger(__name__)
+
+# 24時間取引の BTC-USD は頻繁に、株式は取引時間に合わせて更新する
+REFRESH_INTERVALS = {"BTC-USD": 300, "MSTR": 900}
+RETRY_INTERVAL = 60
+
+
+def intervals_from_env(value=None):
+    # DCA_REFRESH_INTERVALS="BTC-USD=300,MSTR=900"
+    value = value if value is not None else os.environ.get("DCA_REFRESH_INTERVALS", "")
+    intervals = dict(REFRESH_INTERVALS)
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        source, seconds = item.split("=")
+        intervals[source.strip()] = float(seconds)
+    return intervals
+
+
+class Refresher:
+    def __init__(self, sources=data_loader.TICKERS, intervals=None, on_refresh=None):
+        self.sources = list(sources)
+        self.intervals = intervals or intervals_from_env()
+        # on_refresh(source, snapshot) は更新のたびに呼ばれる(キャッシュの温め直しなど)
+        self.on_refresh = on_refresh
+        self.last_error = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def next_delay(self, source):
+        interval = self.intervals.get(source, data_loader.CACHE_TTL)
+        if source in data_loader.MARKET_TICKERS and not data_loader.market_is_open():
+            # 取引時間外は次の寄り付きまで値が変わらない
+            return data_loader.cache_ttl(source)
+        return interval
+
+    def refresh(self, source):
+        try:
+            snapshot = data_loader.refresh_snapshot(source)
+            self.last_error.pop(source, None)
+        except Exception as e:
+            logger.exception("background refresh of %s failed", source)
+            self.last_error[source] = e
+            return RETRY_INTERVAL
+        if self.on_refresh is not None:
+            try:
+                self.on_refresh(source, snapshot)
+            except Exception:
+                logger.exception("on_refresh callback for %s failed", source)
+        return self.next_delay(source)
+
+    def run(self):
+        due = {source: 0.0 for source in self.sources}
+        while not self._stop.is_set():
+            now = time.monotonic()
+            for source, at in due.items():
+                if at <= now:
+                    due[source] = time.monotonic() + self.refresh(source)
+            self._stop.wait(max(0.0, min(due.values()) - time.monotonic()))
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.is_running():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="dca-refresher", daemon=True)
+        self._thread.start()
+        data_loader.set_background_refresh(self._thread)
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        data_loader.set_background_refresh(None)
+        if self._thread is not None:
+            self._thread.join(timeout)
@@ -0,0 +1,96 @@
+import csv
+import os
+import re
+from functools import partial
+
+from dca import grid
+from dca.visualizer import Visualizer
+
+FORMATS = ("png", "svg")
+SUMMARY_FIELDS = grid.GRID_KEYS + (
+    "purchases",
+    "invested",
+    "final_value",
+    "roi",
+    "files",
+    "error",
+)
+
+
+def scenario_name(scenario):
+    years = scenario["accumulate_years"] or "all"
+    name = (
+        f"{scenario['source']}_{scenario['timeframe']}_{float(scenario['investment']):g}"
+        f"_{scenario['start_date']}_{years}"
+    )
+    return re.sub(r"[^A-Za-z0-9._-]", "_", name)
+
+
+def scenario_title(scenario):
+    years = scenario["accumulate_years"]
+    period = f"{years}y" if years else "to date"
+    return (
+        f"{scenario['source']} ${float(scenario['investment']):g} every {scenario['timeframe']}"
+        f" from {scenario['start_date']} ({period})"
+    )
+
+
+def render_scenario(out_dir, formats, max_points, directory, scenario):
+    try:
+        result = grid.calculate_scenario(directory, scenario)
+        row = grid.scenario_summary(scenario, result)
+        # 集計は間引く前の結果から、グラフは間引いた結果から作る
+        chart = result.downsample(max_points)
+        visualizer = Visualizer()
+        name = scenario_name(scenario)
+        files = [
+            visualizer.render(
+                chart, os.path.join(out_dir, f"{name}.{fmt}"), scenario_title(scenario)
+            )
+            for fmt in formats
+        ]
+        row["files"] = ";".join(os.path.basename(path) for path in files)
+        return row
+    except Exception as e:
+        return {**scenario, "error": str(e)}
+
+
+def render_chunk(out_dir, formats, max_points, directory, scenarios):
+    return [
+        render_scenario(out_dir, formats, max_points, directory, scenario)
+        for scenario in scenarios
+    ]
+
+
+def run_report(
+    scenarios,
+    out_dir,
+    formats=("png",),
+    max_points=2000,
+    chunk_size=16,
+    pool=None,
+):
+    # 各ワーカーが自分の Figure でグラフを描き、summary.csv に1シナリオ1行で書く
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        raise ValueError(f"Unknown formats: {', '.join(sorted(unknown))}")
+    chunk_size = grid.check_chunk_size(chunk_size)
+    os.makedirs(out_dir, exist_ok=True)
+    directory = grid.prepare_columns(sorted({s["source"] for s in scenarios}))
+    summary_path = os.path.join(out_dir, "summary.csv")
+    failed = 0
+    with open(summary_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        rows = grid.run_grid(
+            scenarios,
+            directory,
+            pool=pool,
+            chunk_size=chunk_size,
+            # プロセスプールに渡せるように、モジュールの関数を部分適用する
+            chunk_fn=partial(render_chunk, out_dir, tuple(formats), max_points),
+        )
+        for row in rows:
+            failed += "error" in row
+            writer.writerow(row)
+    return summary_path, failed
@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+
+from dca.calculator import accumulate
+from dca.price_store import ADJUSTMENT_TOLERANCE
+from dca.views import RESAMPLE_RULES, get_view, period_labels
+
+
+def _day(date):
+    return int(np.datetime64(pd.Timestamp(date), "D").astype(np.int64))
+
+
+class DCAAccumulator:
+    # (timeframe, start, window) ごとの累計保有数量・投資額を持ち、
+    # 新しい終値を O(1) で取り込む。結果は calculate() の最後の点と一致する
+    def __init__(self, investment_amount, timeframe, start_date, accumulate_years=None):
+        if timeframe != "day" and timeframe not in RESAMPLE_RULES:
+            timeframe = "year"
+        self.investment_amount = investment_amount
+        self.timeframe = timeframe
+        self.start_date = pd.Timestamp(start_date)
+        self.end_date = None
+        if accumulate_years:
+            self.end_date = self.start_date + pd.DateOffset(years=accumulate_years)
+        self._start = _day(self.start_date)
+        self._end = None if self.end_date is None else _day(self.end_date)
+
+        self.total_units = 0.0
+        self.purchases = 0
+        # 現在の期間と、その期間で購入したバー
+        self.period = None
+        self.purchase_day = None
+        self.purchase_close = None
+        self.purchase_units = 0.0
+        # 最後に取り込んだバー(評価額の計算用)と、その一つ前の確定済みのバー
+        self.last_day = None
+        self.last_close = None
+        self.previous_day = None
+        self.previous_close = None
+
+    @classmethod
+    def from_history(
+        cls, prices, investment_amount, timeframe, start_date, accumulate_years=None
+    ):
+        # 過去分はベクトル化した計算で一度だけ初期化する
+        acc = cls(investment_amount, timeframe, start_date, accumulate_years)
+        view = get_view(prices, acc.timeframe)
+        dates, closes = view.slice(acc.start_date, acc.end_date)
+        result = accumulate(dates, closes, investment_amount)
+
+        day_view = get_view(prices, "day")
+        if len(day_view):
+            acc.last_day = _day(day_view.dates[-1])
+            acc.last_close = float(day_view.closes[-1])
+        if len(day_view) > 1:
+            acc.previous_day = _day(day_view.dates[-2])
+            acc.previous_close = float(day_view.closes[-2])
+        if not len(result):
+            return acc
+
+        acc.total_units = float(result.units[-1])
+        acc.purchases = len(result)
+        acc.period = _day(result.dates[-1])
+        acc.purchase_close = float(closes[-1])
+        acc.purchase_units = investment_amount / acc.purchase_close
+        # 最後の期間で実際に購入したバー (期間内で最初の有効なバー)
+        days = day_view.dates.astype("datetime64[D]").astype(np.int64)
+        labels = period_labels(days, acc.timeframe)
+        acc.purchase_day = int(days[np.searchsorted(labels, acc.period)])
+        return acc
+
+    @property
+    def invested(self):
+        return self.investment_amount * self.purchases
+
+    def _in_window(self, period):
+        return period >= self._start and (self._end is None or period <= self._end)
+
+    def update(self, date, close):
+        day = _day(date)
+        close = float(close)
+        if np.isnan(close) or (self.last_day is not None and day < self.last_day):
+            # 欠損値と過去のバーは無視する
+            return None
+        if self.last_day is not None and day > self.last_day:
+            self.previous_day = self.last_day
+            self.previous_close = self.last_close
+        self.last_day = day
+        self.last_close = close
+
+        period = int(period_labels(np.array([day]), self.timeframe)[0])
+        if self._in_window(period):
+            if period != self.period:
+                # 新しい期間の最初のバーで購入する
+                self.period = period
+                self.purchase_day = day
+                self.purchases += 1
+                self.purchase_units = 0.0
+            if day == self.purchase_day:
+                # 購入したバーの終値が更新された場合は買い直す
+                self.total_units -= self.purchase_units
+                self.purchase_units = self.investment_amount / close
+                self.total_units += self.purchase_units
+                self.purchase_close = close
+        return self.state()
+
+    def history_changed(self, prices):
+        # 分割などで過去の終値が書き換えられていれば True (差分では追えないので作り直す)。
+        # 最新のバーは当日分の更新で変わりうるので、確定済みの直前のバーと購入したバーを比べる
+        day_view = get_view(prices, "day")
+        days = day_view.dates.astype("datetime64[D]").astype(np.int64)
+        for day, close in (
+            (self.previous_day, self.previous_close),
+            (self.purchase_day, self.purchase_close),
+        ):
+            if day is None or day == self.last_day:
+                continue
+            i = np.searchsorted(days, day)
+            if i == len(days) or days[i] != day:
+                return True
+            if not np.isclose(day_view.closes[i], close, rtol=ADJUSTMENT_TOLERANCE, atol=0.0):
+                return True
+        return False
+
+    def state(self):
+        if self.period is None:
+            date = None
+            value = 0.0
+        else:
+            date = str(np.datetime64(self.period, "D"))
+            value = self.total_units * self.purchase_close
+        return {
+            "date": date,
+            "value": value,
+            "mark_value": self.total_units * (self.last_close or 0.0),
+            "units": self.total_units,
+            "invested": self.invested,
+            "purchases": self.purchases,
+        }
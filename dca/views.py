@@ -0,0 +1,200 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from dca.metrics import span
+
+TIMEFRAMES = ("day", "week", "month", "year")
+RESAMPLE_RULES = {"week": "W", "month": "M", "year": "Y"}
+
+
+def resample(frame, timeframe):
+    # 指定された期間に合わせてデータをリサンプリング
+    if timeframe == "day":
+        return frame
+    return frame.resample(RESAMPLE_RULES.get(timeframe, "Y")).first()
+
+
+def close_prices(frame):
+    close = frame["Close"]
+    # yfinance の MultiIndex 列の場合は DataFrame になるので先頭列を使う
+    if isinstance(close, pd.DataFrame):
+        close = close.iloc[:, 0]
+    return close.to_numpy(dtype=np.float64)
+
+
+def date_bounds(dates, start=None, end=None):
+    # index >= start かつ index <= end の範囲を二分探索で求める
+    lo = 0 if start is None else np.searchsorted(dates, np.datetime64(start), "left")
+    hi = len(dates) if end is None else np.searchsorted(dates, np.datetime64(end), "right")
+    return lo, hi
+
+
+class PriceColumns:
+    # 日付(datetime64[ns])と終値(float64)の列。終値が欠けている行は含めない。
+    # numpy.memmap をそのまま渡せるので、pandas の DataFrame を作らずに計算できる
+    def __init__(self, dates, closes):
+        self.dates = dates
+        self.closes = closes
+
+    def __len__(self):
+        return len(self.dates)
+
+
+def last_close(data):
+    if isinstance(data, PriceViews):
+        data = data.data
+    if isinstance(data, PriceColumns):
+        return float(data.closes[-1])
+    return float(close_prices(data)[-1])
+
+
+def first_date(data):
+    if isinstance(data, PriceViews):
+        data = data.data
+    if isinstance(data, PriceColumns):
+        return pd.Timestamp(data.dates[0])
+    return data.index.min()
+
+
+def period_labels(days, timeframe):
+    # pandas の resample("W"/"M"/"Y") と同じく、各期間の最終日をラベルにする
+    if timeframe == "day":
+        return days
+    if timeframe == "week":
+        # 1970-01-01 は木曜日。週は日曜日締め
+        return days + (6 - (days + 3) % 7)
+    unit = "M" if timeframe == "month" else "Y"
+    periods = days.astype("datetime64[D]").astype(f"datetime64[{unit}]")
+    return (periods + 1).astype("datetime64[D]").astype(np.int64) - 1
+
+
+def scheduled_days(first_day, last_day, timeframe, anchor):
+    # 予定した購入日(エポックからの日数)。
+    # week: anchor は曜日 (0=月曜 ... 6=日曜)、month: anchor は日 (1-31、月末で切り詰め)
+    if timeframe == "week":
+        if not 0 <= anchor <= 6:
+            raise ValueError("Weekly anchor must be a weekday between 0 (Mon) and 6 (Sun)")
+        first = first_day + (anchor - (first_day + 3) % 7) % 7
+        return np.arange(first, last_day + 1, 7, dtype=np.int64)
+    if timeframe == "month":
+        if not 1 <= anchor <= 31:
+            raise ValueError("Monthly anchor must be a day of month between 1 and 31")
+        months = np.arange(
+            np.datetime64(int(first_day), "D").astype("datetime64[M]"),
+            np.datetime64(int(last_day), "D").astype("datetime64[M]") + 1,
+        )
+        starts = months.astype("datetime64[D]").astype(np.int64)
+        lengths = (months + 1).astype("datetime64[D]").astype(np.int64) - starts
+        days = starts + np.minimum(anchor, lengths) - 1
+        return days[(days >= first_day) & (days <= last_day)]
+    raise ValueError("anchor is only supported for week and month timeframes")
+
+
+class ResampledView:
+    # リサンプリング済みの日付と終値。終値が欠けている行は購入対象外なので含めない
+    def __init__(self, dates, closes):
+        self.dates = dates
+        self.closes = closes
+
+    @classmethod
+    def from_frame(cls, frame, timeframe):
+        if not frame.index.is_monotonic_increasing:
+            frame = frame.sort_index()
+        resampled = resample(frame, timeframe)
+        dates = resampled.index.to_numpy()
+        closes = close_prices(resampled)
+        valid = ~np.isnan(closes)
+        return cls(dates[valid], closes[valid])
+
+    @classmethod
+    def from_columns(cls, columns, timeframe):
+        # 列には欠損がないので、日次はマップした配列をコピーせずにそのまま使う
+        if timeframe == "day":
+            return cls(columns.dates, columns.closes)
+        if timeframe not in RESAMPLE_RULES:
+            timeframe = "year"
+        days = columns.dates.astype("datetime64[D]").astype(np.int64)
+        labels = period_labels(days, timeframe)
+        # 各期間の最初の有効な終値 (resample().first() と同じ)
+        first = np.flatnonzero(np.diff(labels, prepend=labels[:1] - 1))
+        return cls(
+            labels[first].astype("datetime64[D]").astype("datetime64[ns]"),
+            np.asarray(columns.closes[first]),
+        )
+
+    @classmethod
+    def from_schedule(cls, day_view, timeframe, anchor):
+        # 予定日が休場日なら、その後の最初の取引日に買う
+        if not len(day_view):
+            return cls(day_view.dates, day_view.closes)
+        trading_days = day_view.dates.astype("datetime64[D]").astype(np.int64)
+        scheduled = scheduled_days(trading_days[0], trading_days[-1], timeframe, anchor)
+        # 長い欠損などで同じバーに当たった場合は一度だけ買う
+        bars = np.unique(np.searchsorted(trading_days, scheduled, "left"))
+        return cls(day_view.dates[bars], day_view.closes[bars])
+
+    def __len__(self):
+        return len(self.dates)
+
+    def bounds(self, start=None, end=None):
+        return date_bounds(self.dates, start, end)
+
+    def slice(self, start=None, end=None):
+        lo, hi = self.bounds(start, end)
+        return self.dates[lo:hi], self.closes[lo:hi]
+
+
+class PriceViews:
+    # 価格データと、そのデータから作った期間ごとのビュー。ローダーのスナップショットが
+    # バージョンごとに一つ持つ。ビューは期間ごとに初めて使われたときに作る
+    def __init__(self, data, version=None):
+        self.data = data
+        self.version = version
+        self._views = {}
+        self._schedules = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, timeframe):
+        # 未知の期間は従来どおり年次として扱う
+        if timeframe not in TIMEFRAMES:
+            timeframe = "year"
+        with self._lock:
+            view = self._views.get(timeframe)
+            if view is None:
+                view = self._views[timeframe] = build_view(self.data, timeframe)
+        return view
+
+    def schedule(self, timeframe, anchor):
+        # 曜日・日付を固定した購入スケジュール。データのバージョンごとに一度だけ作る
+        key = (timeframe, anchor)
+        day_view = self["day"]
+        with self._lock:
+            view = self._schedules.get(key)
+            if view is None:
+                view = self._schedules[key] = ResampledView.from_schedule(
+                    day_view, timeframe, anchor
+                )
+        return view
+
+
+@span("resample")
+def build_view(data, timeframe):
+    if isinstance(data, PriceColumns):
+        return ResampledView.from_columns(data, timeframe)
+    return ResampledView.from_frame(data, timeframe)
+
+
+def get_view(data, timeframe, anchor=None):
+    # data が PriceViews なら作り置きのビューを使う。DataFrame や PriceColumns を
+    # 直接渡された場合は呼び出し側が中身を書き換えうるので、毎回作り直す
+    if isinstance(data, PriceViews):
+        if anchor is None:
+            return data[timeframe]
+        return data.schedule(timeframe, anchor)
+    if timeframe not in TIMEFRAMES:
+        timeframe = "year"
+    if anchor is None:
+        return build_view(data, timeframe)
+    return ResampledView.from_schedule(build_view(data, "day"), timeframe, anchor)
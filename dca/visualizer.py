@@ -1,20 +1,48 @@
-import matplotlib.pyplot as plt
+def _columns(returns_data):
+    # DCAResult(列指向)でも従来の list-of-dict でも受け付ける
+    if hasattr(returns_data, "value"):
+        return returns_data.dates, returns_data.value
+    dates = [r["date"] for r in returns_data]
+    values = [r["value"] for r in returns_data]
+    return dates, values
 
 
 class Visualizer:
-    def __init__(self):
-        pass
+    def __init__(self, figsize=(10, 5), dpi=100):
+        self.figsize = figsize
+        self.dpi = dpi
+
+    def draw(self, ax, returns_data, title="DCA Investment Returns"):
+        dates, values = _columns(returns_data)
+        # 点が多いときはマーカーを描かない
+        ax.plot(dates, values, marker="o" if len(values) <= 200 else None, label="Value")
+        if hasattr(returns_data, "invested"):
+            ax.plot(dates, returns_data.invested, linestyle="--", label="Invested")
+            ax.legend()
+        ax.set_xlabel("Date")
+        ax.set_ylabel("Portfolio Value")
+        ax.set_title(title)
+        ax.grid(True)
+
+    def render(self, returns_data, path, title="DCA Investment Returns"):
+        # pyplot のグローバル状態を使わずに Agg で描いてファイルに保存する。
+        # 形式(PNG/SVG など)は拡張子で決まる。スレッドやプロセスごとに並列に使える
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        fig = Figure(figsize=self.figsize, dpi=self.dpi)
+        FigureCanvasAgg(fig)
+        self.draw(fig.add_subplot(), returns_data, title)
+        fig.tight_layout()
+        fig.savefig(path)
+        return path
 
     def plot_returns(self, returns_data):
-        # returns_dataを使ってグラフを描画
-        # 例:
-        dates = [r["date"] for r in returns_data]
-        values = [r["value"] for r in returns_data]
-        plt.figure(figsize=(10, 5))
-        plt.plot(dates, values, marker="o")
-        plt.xlabel("Date")
-        plt.ylabel("Portfolio Value")
-        plt.title("DCA Investment Returns")
-        plt.grid(True)
-        plt.tight_layout()
+        # 対話的に表示する場合だけ pyplot を使う
+        import matplotlib.pyplot as plt
+
+        fig, ax = plt.subplots(figsize=self.figsize, dpi=self.dpi)
+        self.draw(ax, returns_data)
+        fig.tight_layout()
         plt.show()
+
@@ -0,0 +1,8 @@
+import pytest
+
+from tests.reference import make_prices
+
+
+@pytest.fixture(params=["bday", "calendar"])
+def prices(request):
+    return make_prices(request.param)
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+
+# 置き換える前の DCA_Calculator.calculate_returns (iterrows のループ) をそのまま残したもの。
+# ベクトル化した実装がこの結果と一致することを確認するのに使う
+def reference_returns(
+    investment_amount, timeframe, historical_data, start_date=None, accumulate_years=None
+):
+    returns = []
+    total_units = 0
+    start_date = pd.to_datetime(start_date) if start_date else historical_data.index.min()
+    if timeframe == "week":
+        resampled = historical_data.resample("W").first()
+    elif timeframe == "month":
+        resampled = historical_data.resample("M").first()
+    elif timeframe == "day":
+        resampled = historical_data
+    else:
+        resampled = historical_data.resample("Y").first()
+
+    resampled = resampled[resampled.index >= start_date]
+    if accumulate_years:
+        end_date = start_date + pd.DateOffset(years=accumulate_years)
+        resampled = resampled[resampled.index <= end_date]
+
+    for date, row in resampled.iterrows():
+        price = row["Close"]
+        if isinstance(price, pd.Series):
+            price = price.iloc[0]
+        if pd.isna(price):
+            continue
+        units = investment_amount / price
+        total_units += units
+        current_value = total_units * price
+        returns.append({"date": date, "value": current_value, "units": total_units})
+
+    return returns
+
+
+def make_prices(kind, periods=1500, seed=0):
+    # 営業日だけのデータ(株)と土日を含むデータ(BTC)。ところどころ終値を欠かし、
+    # 週まるごと欠けている期間も作る
+    rng = np.random.default_rng(seed)
+    if kind == "bday":
+        index = pd.bdate_range("2015-01-02", periods=periods)
+    else:
+        index = pd.date_range("2015-01-01", periods=periods)
+    closes = np.exp(np.cumsum(rng.normal(0, 0.03, periods))) * 100
+    closes[rng.random(periods) < 0.05] = np.nan
+    closes[0] = np.nan
+    closes[100:115] = np.nan
+    return pd.DataFrame({"Close": closes}, index=pd.Index(index, name="Date"))
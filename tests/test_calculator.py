@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dca.calculator import DCA_Calculator
+from dca.mmap_store import frame_to_columns, open_columns, write_columns
+from dca.views import TIMEFRAMES, PriceViews
+from tests.reference import reference_returns
+
+WINDOWS = [
+    (None, None),
+    ("2015-03-07", None),
+    ("2016-01-01", 1),
+    ("2015-06-15", 2),
+    ("2017-12-31", 0),
+]
+
+
+def assert_same_returns(expected, actual):
+    assert len(actual) == len(expected)
+    for want, got in zip(expected, actual):
+        assert pd.Timestamp(got["date"]) == pd.Timestamp(want["date"])
+        assert got["value"] == pytest.approx(want["value"], rel=1e-9)
+
+
+@pytest.mark.parametrize("timeframe", TIMEFRAMES)
+@pytest.mark.parametrize("start_date,accumulate_years", WINDOWS)
+def test_matches_original_loop(prices, timeframe, start_date, accumulate_years):
+    expected = reference_returns(10, timeframe, prices, start_date, accumulate_years)
+    calculator = DCA_Calculator(10, timeframe, prices, start_date, accumulate_years)
+    assert_same_returns(expected, calculator.calculate_returns())
+
+
+@pytest.mark.parametrize("timeframe", TIMEFRAMES)
+def test_columns_match_original_loop(prices, timeframe, tmp_path):
+    expected = reference_returns(10, timeframe, prices, "2015-03-07", 2)
+    write_columns(str(tmp_path), "TEST", "v1", prices)
+    for columns in (frame_to_columns(prices), open_columns(str(tmp_path), "TEST")):
+        calculator = DCA_Calculator(10, timeframe, columns, "2015-03-07", 2)
+        assert_same_returns(expected, calculator.calculate_returns())
+
+
+def test_compact_keeps_final_point(prices):
+    expected = reference_returns(10, "week", prices)
+    result = DCA_Calculator(10, "week", prices).calculate(compact=True)
+    assert len(result) == len(expected)
+    assert result.final_value == pytest.approx(expected[-1]["value"], rel=1e-12)
+    assert np.allclose(result.value, [row["value"] for row in expected], rtol=1e-6)
+
+
+def test_frame_edited_in_place(prices):
+    # 直接渡した DataFrame はキャッシュしないので、書き換えた結果がそのまま反映される
+    calculator = DCA_Calculator(10, "day", prices)
+    calculator.calculate_returns()
+    last = prices["Close"].last_valid_index()
+    prices.loc[last, "Close"] *= 2
+    prices.loc[prices.index[-1] + pd.Timedelta(days=1), "Close"] = 50.0
+    assert_same_returns(reference_returns(10, "day", prices), calculator.calculate_returns())
+
+
+def test_views_built_per_timeframe(prices):
+    views = PriceViews(prices, "v1")
+    DCA_Calculator(10, "week", views).calculate()
+    assert list(views._views) == ["week"]
+    assert views["week"] is views["week"]
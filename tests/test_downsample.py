@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from dca.downsample import MIN_POINTS, lttb_indices
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("max_points", [MIN_POINTS, 5, 7, 50, 999])
+def test_keeps_endpoints_and_extrema(seed, max_points):
+    rng = np.random.default_rng(seed)
+    y = np.cumsum(rng.normal(size=1000))
+    x = np.arange(len(y), dtype=np.float64)
+    indices = lttb_indices(x, y, max_points)
+    assert len(indices) <= max_points
+    assert np.all(np.diff(indices) > 0)
+    assert {0, len(y) - 1, int(np.argmax(y)), int(np.argmin(y))} <= set(indices.tolist())
+
+
+def test_extrema_at_endpoints():
+    y = np.arange(100, dtype=np.float64)
+    indices = lttb_indices(np.arange(100), y, MIN_POINTS)
+    assert len(indices) == MIN_POINTS
+    assert indices[0] == 0 and indices[-1] == 99
+
+
+def test_short_series_untouched():
+    assert lttb_indices(np.arange(3), np.arange(3), 3).tolist() == [0, 1, 2]
+
+
+def test_rejects_too_few_points():
+    with pytest.raises(ValueError):
+        lttb_indices(np.arange(100), np.arange(100), MIN_POINTS - 1)
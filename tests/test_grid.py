@@ -0,0 +1,21 @@
+import pytest
+
+from dca import grid
+
+
+@pytest.mark.parametrize("chunk_size", [0, -1, "x"])
+def test_run_grid_rejects_bad_chunk_size(chunk_size):
+    # 結果を返し始める前(呼び出した時点)で失敗する
+    with pytest.raises(ValueError):
+        grid.run_grid([], "unused", chunk_size=chunk_size)
+
+
+@pytest.mark.parametrize("years", [0.5, 1.5, -1, "2", True])
+def test_expand_grid_rejects_fractional_years(years):
+    with pytest.raises(ValueError):
+        grid.expand_grid({"accumulate_years": [years]})
+
+
+def test_expand_grid_whole_years():
+    scenarios = grid.expand_grid({"accumulate_years": [None, 0, 2, 3.0]})
+    assert [s["accumulate_years"] for s in scenarios] == [None, None, 2, 3]
@@ -0,0 +1,49 @@
+import os
+import shutil
+
+from dca import mmap_store
+from dca.mmap_store import open_columns, write_columns
+
+
+def test_publish_and_prune(prices, tmp_path):
+    directory = str(tmp_path)
+    for i in range(5):
+        write_columns(directory, "TEST", f"v{i}", prices)
+        columns = open_columns(directory, "TEST")
+        assert len(columns) == prices["Close"].notna().sum()
+    names = sorted(os.listdir(tmp_path / "TEST"))
+    assert names == ["current", "v2", "v3", "v4"]
+    assert os.readlink(tmp_path / "TEST" / "current") == "v4"
+
+
+def test_prune_skips_versions_removed_concurrently(prices, tmp_path, monkeypatch):
+    directory = str(tmp_path)
+    for i in range(3):
+        write_columns(directory, "TEST", f"v{i}", prices)
+    scandir = os.scandir
+
+    def racing_scandir(path):
+        # 銘柄のディレクトリの一覧を取った直後に、別のプロセスが古い版を消した状態を作る
+        if path != os.path.join(directory, "TEST"):
+            return scandir(path)
+        entries = list(scandir(path))
+        shutil.rmtree(os.path.join(path, "v0"))
+        return iter(entries)
+
+    monkeypatch.setattr(mmap_store.os, "scandir", racing_scandir)
+    write_columns(directory, "TEST", "v3", prices)
+    assert sorted(os.listdir(tmp_path / "TEST")) == ["current", "v1", "v2", "v3"]
+
+
+def test_prune_removes_stale_temp_dirs(prices, tmp_path):
+    directory = str(tmp_path)
+    write_columns(directory, "TEST", "v0", prices)
+    stale = tmp_path / "TEST" / ".tmp-crashed"
+    fresh = tmp_path / "TEST" / ".tmp-writing"
+    stale.mkdir()
+    fresh.mkdir()
+    old = stale.stat().st_mtime - mmap_store.STALE_TMP_SECONDS - 1
+    os.utime(stale, (old, old))
+    write_columns(directory, "TEST", "v1", prices)
+    assert not stale.exists()
+    assert fresh.exists()
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dca.portfolio import Portfolio
+from dca.views import TIMEFRAMES
+from tests.reference import make_prices, reference_returns
+
+WEIGHTS = {"MSTR": 0.6, "BTC-USD": 0.4}
+
+
+@pytest.fixture
+def frames():
+    # 営業日だけの資産と土日も値のある資産を混ぜ、カレンダーが揃わない状態にする
+    return {
+        "MSTR": make_prices("bday", seed=1),
+        "BTC-USD": make_prices("calendar", seed=2),
+    }
+
+
+@pytest.mark.parametrize("timeframe", TIMEFRAMES)
+@pytest.mark.parametrize("start_date,accumulate_years", [(None, None), ("2015-03-07", 2)])
+def test_matches_original_loop_per_asset(frames, timeframe, start_date, accumulate_years):
+    result = Portfolio(WEIGHTS).calculate(
+        frames, 100, timeframe, start_date, accumulate_years, compact=False
+    )
+    dates = pd.DatetimeIndex(result.dates)
+    expected_value = np.zeros(len(dates))
+    expected_invested = np.zeros(len(dates))
+    for ticker, weight in WEIGHTS.items():
+        amount = 100 * weight
+        expected = reference_returns(
+            amount, timeframe, frames[ticker], start_date or "2015-01-01", accumulate_years
+        )
+        records = result[ticker].to_records()
+        assert len(records) == len(expected)
+        for want, got in zip(expected, records):
+            assert pd.Timestamp(got["date"]) == pd.Timestamp(want["date"])
+            assert got["value"] == pytest.approx(want["value"], rel=1e-9)
+
+        # ポートフォリオ全体は、各資産の直近の購入時点の評価額・投資額の合計
+        purchases = pd.DatetimeIndex([row["date"] for row in expected])
+        last = np.searchsorted(purchases, dates, side="right") - 1
+        held = last >= 0
+        values = np.array([row["value"] for row in expected])
+        expected_value[held] += values[last[held]]
+        expected_invested[held] += amount * (last[held] + 1)
+    assert np.allclose(result.value, expected_value, rtol=1e-9)
+    assert np.allclose(result.invested, expected_invested, rtol=1e-9)
@@ -0,0 +1,68 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dca.price_store import CSVFetcher, PriceStore
+
+
+@pytest.fixture
+def source(tmp_path):
+    index = pd.bdate_range("2020-01-01", periods=100, name="Date")
+    closes = np.linspace(100, 200, len(index))
+    frame = pd.DataFrame(
+        {"Open": closes, "Close": closes, "Volume": np.arange(len(index)) + 1000}, index=index
+    )
+    (tmp_path / "src").mkdir()
+    frame.to_csv(tmp_path / "src" / "TEST.csv")
+    return frame
+
+
+def write_source(tmp_path, frame):
+    frame.to_csv(tmp_path / "src" / "TEST.csv")
+
+
+def make_store(tmp_path):
+    return PriceStore(str(tmp_path / "store"), CSVFetcher(str(tmp_path / "src")))
+
+
+def test_read_pins_price_dtypes(tmp_path, source):
+    store = make_store(tmp_path)
+    store.refresh("TEST")
+    frame = store.read("TEST")
+    assert list(frame.columns) == ["Open", "Close", "Volume"]
+    assert frame["Close"].dtype == np.float64
+    assert frame["Volume"].dtype == np.int64
+
+
+def test_unchanged_refresh_skips_write(tmp_path, source):
+    store = make_store(tmp_path)
+    store.refresh("TEST")
+    inode = os.stat(store.path("TEST")).st_ino
+    frame = store.refresh("TEST")
+    assert os.stat(store.path("TEST")).st_ino == inode
+    assert len(frame) == len(source)
+
+
+def test_new_bars_are_appended(tmp_path, source):
+    store = make_store(tmp_path)
+    write_source(tmp_path, source.iloc[:90])
+    store.refresh("TEST")
+    write_source(tmp_path, source)
+    frame = store.refresh("TEST")
+    assert len(frame) == len(source)
+    # 別のプロセスのストアも書き換えたファイルを読み直す
+    assert make_store(tmp_path).refresh("TEST")["Close"].iloc[-1] == source["Close"].iloc[-1]
+
+
+def test_adjusted_history_is_refetched(tmp_path, source):
+    store = make_store(tmp_path)
+    write_source(tmp_path, source.iloc[:90])
+    store.refresh("TEST")
+    split = source.copy()
+    split[["Open", "Close"]] /= 10
+    write_source(tmp_path, split)
+    frame = store.refresh("TEST")
+    assert np.allclose(frame["Close"], split["Close"])
+    assert np.allclose(store.read("TEST")["Close"], split["Close"])
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dca.calculator import DCA_Calculator
+
+
+@pytest.fixture
+def result(prices):
+    return DCA_Calculator(10, "day", prices).calculate(compact=False)
+
+
+def test_compact_round_trip(result):
+    compact = result.compact()
+    restored = compact.to_result()
+    assert len(restored) == len(result)
+    assert (pd.DatetimeIndex(restored.dates) == pd.DatetimeIndex(result.dates)).all()
+    for name in ("value", "units", "invested"):
+        assert np.allclose(getattr(restored, name), getattr(result, name), rtol=1e-6)
+        # 最後の点は float64 の値がそのまま戻る
+        assert getattr(restored, name)[-1] == getattr(result, name)[-1]
+    assert compact.final_value == result.final_value
+
+
+def test_compact_take(result):
+    compact = result.compact()
+    head = compact.take(np.arange(10))
+    assert len(head) == 10
+    assert head.nbytes == 10 * 16
+    assert head.final_value == pytest.approx(result.value[9], rel=1e-6)
+    assert np.allclose(head.to_result().value, result.value[:10], rtol=1e-6)
+
+    tail = compact.take(np.arange(len(result) - 10, len(result)))
+    assert tail.nbytes == 10 * 16 + compact.last().nbytes
+    assert tail.final_value == result.final_value
+
+
+def test_compact_downsample(result):
+    compact = result.compact()
+    sampled = compact.downsample(100)
+    assert len(sampled) <= 100
+    assert sampled.days[0] == compact.days[0]
+    assert sampled.days[-1] == compact.days[-1]
+    assert sampled.final_value == result.final_value
+    assert sampled.nbytes < compact.nbytes
+
+    expected = result.downsample(100)
+    assert (pd.DatetimeIndex(sampled.dates) == pd.DatetimeIndex(expected.dates)).all()
+    assert np.allclose(sampled.to_result().value, expected.value, rtol=1e-6)
+    assert compact.downsample(None) is compact
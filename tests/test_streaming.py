@@ -0,0 +1,67 @@
+import pytest
+
+from dca.streaming import DCAAccumulator
+from dca.views import TIMEFRAMES
+from tests.reference import reference_returns
+
+START_DATE = "2015-03-07"
+
+
+def assert_matches_reference(state, prices, timeframe, accumulate_years):
+    expected = reference_returns(10, timeframe, prices, START_DATE, accumulate_years)
+    assert state["purchases"] == len(expected)
+    assert state["invested"] == pytest.approx(10 * len(expected))
+    assert state["units"] == pytest.approx(expected[-1]["units"], rel=1e-9)
+    assert state["value"] == pytest.approx(expected[-1]["value"], rel=1e-9)
+
+
+@pytest.mark.parametrize("timeframe", TIMEFRAMES)
+@pytest.mark.parametrize("accumulate_years", [None, 2])
+@pytest.mark.parametrize("split", [200, 700])
+def test_updates_match_original_loop(prices, timeframe, accumulate_years, split):
+    # 途中までを from_history で初期化し、残りのバーを 1 本ずつ取り込む
+    acc = DCAAccumulator.from_history(
+        prices.iloc[:split], 10, timeframe, START_DATE, accumulate_years
+    )
+    for date, close in prices["Close"].iloc[split:].items():
+        acc.update(date, close)
+    assert_matches_reference(acc.state(), prices, timeframe, accumulate_years)
+
+
+@pytest.mark.parametrize("timeframe", TIMEFRAMES)
+def test_history_matches_original_loop(prices, timeframe):
+    acc = DCAAccumulator.from_history(prices, 10, timeframe, START_DATE)
+    assert_matches_reference(acc.state(), prices, timeframe, None)
+
+
+def test_revised_purchase_close(prices):
+    # 購入したバーの終値が後から訂正された場合は、訂正後のデータと同じ結果になる
+    acc = DCAAccumulator(10, "day", START_DATE)
+    for date, close in prices["Close"].items():
+        acc.update(date, close)
+    revised = prices.copy()
+    last = revised["Close"].last_valid_index()
+    revised.loc[last, "Close"] *= 1.1
+    state = acc.update(last, revised.loc[last, "Close"])
+    expected = reference_returns(10, "day", revised, START_DATE)
+    assert state["value"] == pytest.approx(expected[-1]["value"], rel=1e-9)
+    assert state["units"] == pytest.approx(expected[-1]["units"], rel=1e-9)
+
+
+@pytest.mark.parametrize("timeframe", ["day", "week"])
+def test_split_rewrites_history(prices, timeframe):
+    # 2:1 の分割で過去の終値がすべて半分になった履歴を検出して作り直す
+    acc = DCAAccumulator.from_history(prices.iloc[:-20], 10, timeframe, START_DATE)
+    assert not acc.history_changed(prices)
+    split = prices.copy()
+    split["Close"] /= 2
+    assert acc.history_changed(split)
+    acc = DCAAccumulator.from_history(split, 10, timeframe, START_DATE)
+    assert_matches_reference(acc.state(), split, timeframe, None)
+
+
+def test_todays_update_is_not_a_rewrite(prices):
+    acc = DCAAccumulator.from_history(prices, 10, "day", START_DATE)
+    updated = prices.copy()
+    updated.loc[updated["Close"].last_valid_index(), "Close"] *= 1.05
+    assert not acc.history_changed(updated)